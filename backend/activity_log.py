@@ -0,0 +1,210 @@
+import atexit
+import csv
+import io
+import os
+import queue
+import re
+import threading
+from datetime import datetime
+from bson import json_util
+
+EXPORT_BATCH_SIZE = 1000
+
+LOG_QUEUE_SIZE = 10000      # entries buffered per process before the drop policy kicks in
+LOG_BATCH_SIZE = 500        # max entries per insert_many
+LOG_FLUSH_INTERVAL = 1.0    # seconds the writer waits for more entries before flushing
+LOG_ENQUEUE_TIMEOUT = 0.05  # seconds a request may block on a full queue before dropping
+
+
+class ActivityLogWriter:
+    """Buffers activity log entries and writes them from a background thread.
+
+    Requests only pay for a queue put. The writer thread batches entries into
+    unordered insert_many calls. When the queue is full a request waits up to
+    LOG_ENQUEUE_TIMEOUT (backpressure) and then the entry is dropped and
+    counted, so a Mongo outage cannot stall the web workers. Whatever is still
+    queued is flushed at interpreter shutdown.
+    """
+
+    def __init__(self, database, max_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL, enqueue_timeout=LOG_ENQUEUE_TIMEOUT):
+        self.database = database
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._stop = None
+        self._thread = None
+
+    def _ensure_started(self):
+        # gunicorn forks workers after import, so the thread is started per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def write(self, entry):
+        self._ensure_started()
+        try:
+            self._queue.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                print(f"Activity log queue full, {self.dropped} entries dropped so far")
+
+    def _take_batch(self, wait):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=wait) if wait else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _insert(self, batch):
+        try:
+            self.database.insert_many(batch, ordered=False)
+        except Exception as e:
+            print(f"Failed to write {len(batch)} activity log entries: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                self._insert(batch)
+
+    def flush(self):
+        """Write everything currently queued from the calling thread."""
+        if self._pid != os.getpid():
+            return
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                return
+            self._insert(batch)
+
+    def stop(self, timeout=5):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self.flush()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(database):
+    """Shared writer for a logs collection."""
+    with _writers_lock:
+        writer = _writers.get(database.full_name)
+        if writer is None:
+            writer = _writers[database.full_name] = ActivityLogWriter(database)
+        return writer
+
+
+def build_log_query(args):
+    """Mongo query for the activity log filters (date, optional time, user, action)."""
+    date = args.get('date', '').strip()
+    time = args.get('time', '').strip()
+    user = args.get('user')
+    action = args.get('action')
+
+    query = {}
+
+    # Filter by date and time
+    if date and time:
+        try:
+            datetime_start = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+            datetime_end = datetime_start.replace(second=59)  # Include the entire minute
+            query["timestamp"] = {"$gte": datetime_start, "$lte": datetime_end}
+        except ValueError:
+            pass  # Ignore invalid date/time inputs
+
+    elif date:
+        try:
+            date_start = datetime.strptime(date, "%Y-%m-%d")
+            date_end = date_start.replace(hour=23, minute=59, second=59)  # End of day
+            query["timestamp"] = {"$gte": date_start, "$lte": date_end}
+        except ValueError:
+            pass  # Ignore invalid date inputs
+
+    # Filter by user: case-insensitive "contains", as before. An unanchored regex
+    # cannot be bounded by an index, so this is narrowed by the date filter or scans.
+    if user:
+        query["user"] = {"$regex": re.escape(user), "$options": "i"}
+
+    # Filter by action
+    if action:
+        query["action"] = {"$regex": re.escape(action), "$options": "i"}
+
+    return query
+
+
+def format_log(log):
+    """Add display 'date'/'time' strings to a log entry. Returns None if its timestamp is unusable."""
+    timestamp = log.get("timestamp")
+    if isinstance(timestamp, str):  # Older entries stored the timestamp as a string
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return None
+    if not isinstance(timestamp, datetime):
+        return None
+    log["date"] = timestamp.strftime("%Y-%m-%d")
+    log["time"] = timestamp.strftime("%H:%M:%S")
+    return log
+
+
+def iter_logs(database, query, batch_size=EXPORT_BATCH_SIZE):
+    """Yield formatted log entries newest first without holding the whole log in memory."""
+    cursor = database.find(query, {"_id": 0, "user": 1, "action": 1, "timestamp": 1}) \
+                     .sort("timestamp", -1) \
+                     .batch_size(batch_size)
+    try:
+        for log in cursor:
+            if format_log(log) is not None:
+                yield log
+    finally:
+        cursor.close()
+
+
+def export_logs_csv(database, query):
+    """Stream the matching log entries as CSV, one chunk per row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    writer.writerow(["user", "action", "date", "time"])
+    yield flush()
+    for log in iter_logs(database, query):
+        writer.writerow([log.get("user"), log.get("action"), log["date"], log["time"]])
+        yield flush()
+
+
+def export_logs_ndjson(database, query):
+    """Stream the matching log entries as newline-delimited JSON."""
+    for log in iter_logs(database, query):
+        yield json_util.dumps({
+            "user": log.get("user"),
+            "action": log.get("action"),
+            "timestamp": log["timestamp"],
+        }) + "\n"
@@ -1,5 +1,7 @@
 from libs import *
 from col import *
+from indexes import ensure_indexes, index_report
+from metrics import get_dashboard_metrics, invalidate_dashboard_metrics
 
 app = Flask(__name__)
 
@@ -11,33 +13,220 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 
 UPLOAD_FOLDER = "static/uploads"
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Werkzeug rejects bigger requests (413) before parsing; store_upload enforces the per-file limit
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE + 1024 * 1024
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-scheduler = APScheduler()
-
 
 
 
 fs = gridfs.GridFS(db)
 
+# Resized display/thumbnail copies of uploaded photos, built off the request thread
+image_variants = ImageVariants(fs, db['fs.files'])
+
 
 
-app.config['MAIL_SERVER'] = os.getenv('SMTP_GOOGLE_SERVER')
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER') or os.getenv('SMTP_GOOGLE_SERVER')
+app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT') or 587)
+app.config['MAIL_USE_TLS'] = (os.getenv('MAIL_USE_TLS') or 'true').lower() == 'true'
 app.config['MAIL_USE_SSL'] = False
 app.config['MAIL_USERNAME'] = os.getenv('SMTP_TEST_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('SMTP_TEST_APP_PASSWORD')
+# Internal notifications (new cases) go to the team inbox, never to the customer
+app.config['TEAM_EMAIL'] = os.getenv('TEAM_EMAIL') or app.config['MAIL_USERNAME']
 app.config['MODE'] = os.getenv('MODE')
 
 mail = Mail(app)
 
-@scheduler.task('cron', day=1, hour=0, minute=0)  # Runs every 1st of the month at midnight
-def scheduled_route_update():
-    replicate_monthly_routes(route_list_collection)
+# Outgoing mail is queued in Mongo and delivered by a background worker,
+# started with the other web-process services (see start_background_services)
+mail_worker = MailWorker(app, mail, mail_outbox_collection, fs=fs)
+
+# Dropdown sources, cached per process and kept in step across workers by version counters
+reference_data = ReferenceCache(counters_collection)
+
+@reference_data.loader('models')
+def load_models():
+    return [{k: v for k, v in model.items() if k != '_id'} for model in model_list_collection.find().sort("order", 1)]
+
+@reference_data.loader('essential_oils')
+def load_essential_oils():
+    return [{k: v for k, v in eo.items() if k != '_id'} for eo in eo_pack_collection.find().sort("order", 1)]
 
-scheduler.init_app(app)
-scheduler.start()
+@reference_data.loader('companies')
+def load_companies():
+    return sorted(company for company in services_collection.distinct('company') if company)
+
+# Precomputed company -> premise -> model -> color -> EO trees for the cascading dropdowns
+company_hierarchy = CompanyHierarchy(hierarchy_collection, services_collection, device_list_collection)
+
+# Case numbers come from an atomic counter, seeded from the highest existing case_no on first use.
+# CASE_NO_BLOCK_SIZE > 1 reserves numbers per worker in blocks (fewer round trips, numbers may skip).
+case_numbers = get_sequence(
+    counters_collection, 'case_no',
+    block_size=int(os.getenv('CASE_NO_BLOCK_SIZE') or 1),
+    seed=lambda: (collection.find_one({}, {'case_no': 1}, sort=[('case_no', -1)]) or {}).get('case_no', 0),
+)
+
+# Scheduled jobs run under a Mongo lease with run history (see jobs.py). The
+# scheduler loop runs in its own process (`flask --app app run-scheduler`),
+# not in every gunicorn worker; RUN_SCHEDULER=true runs it in-process instead.
+@job('replicate_monthly_routes', misfire_grace=12 * 3600, day=1, hour=0, minute=0)  # 1st of the month at midnight
+def scheduled_route_update():
+    summary = rollover_routes(route_list_collection, job_checkpoints_collection)
+    log_activity("scheduler", f"rolled over monthly routes: {summary}", logs_collection)
+    return summary
+
+@job('service_reminders', misfire_grace=6 * 3600, hour=8, minute=0)  # Every day at 8am
+def scheduled_service_reminders():
+    summary = send_service_reminders(route_list_collection, profile_list_collection.name,
+                                     mail_outbox_collection, app.config['MAIL_USERNAME'])
+    log_activity("scheduler", f"queued service reminders: {summary}", logs_collection)
+    return summary
+
+@job('migrate_signatures')  # Manual only: moves inline data-URL signatures into GridFS
+def migrate_inline_signatures():
+    return migrate_signatures(fs, db['fs.files'], [collection, change_collection])
+
+@job('rebuild_hierarchy')  # Manual only: rebuilds every company's dropdown tree
+def rebuild_company_hierarchy():
+    return company_hierarchy.rebuild_all()
+
+@job('image_variants')  # Manual only: flask --app app run-job image_variants
+def backfill_image_variants():
+    return image_variants.backfill()
+
+@app.cli.command('run-scheduler')
+def run_scheduler_command():
+    """Run the job scheduler in the foreground."""
+    print(f"Scheduler running jobs: {', '.join(sorted(JOBS))}")
+    run_scheduler()
+
+@app.cli.command('run-job')
+@click.argument('name')
+def run_job_command(name):
+    """Run a job now, under the same lock as scheduled runs."""
+    if name not in JOBS:
+        raise click.BadParameter(f"unknown job, choose from: {', '.join(sorted(JOBS))}", param_hint='NAME')
+    run = run_job(name)
+    if run is None:
+        raise click.ClickException(f"{name} is already running elsewhere")
+    click.echo(f"{name}: {run['status']} in {run['duration']:.1f}s")
+    if run['status'] == 'failed':
+        click.echo(run['error'], err=True)
+        raise SystemExit(1)
+
+@app.cli.command('list-jobs')
+@click.option('--limit', default=20, help='Number of recent runs to show.')
+def list_jobs_command(limit):
+    """List registered jobs and recent runs."""
+    for name in sorted(JOBS):
+        click.echo(f"{name}: {JOBS[name]['trigger'] or 'manual only'}")
+    click.echo("")
+    for run in last_runs(limit):
+        click.echo(f"{run['started_at']:%Y-%m-%d %H:%M:%S}  {run['job']:<28} {run['status']:<8} "
+                   f"{run['trigger']:<8} {run.get('duration', 0):.1f}s  {run['owner']}")
+
+# Background services belong to processes that serve requests. They start on a
+# process's first request rather than at import, so `flask <command>` processes
+# (run-job, ensure-indexes, import-services, the scheduler, the release step)
+# load the app without a mail worker, index build or scheduler thread.
+_background = {'started': False}
+_background_lock = threading.Lock()
+
+def _ensure_indexes_quietly():
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print(f"Failed to ensure indexes on start: {e}")
+
+def start_background_services():
+    """Start this process's mail worker, optional in-process scheduler and index build, once."""
+    with _background_lock:
+        if _background['started']:
+            return
+        _background['started'] = True
+    if (os.getenv('MAIL_WORKER') or 'true').lower() == 'true':
+        mail_worker.start()
+    if (os.getenv('RUN_SCHEDULER') or 'false').lower() == 'true':
+        start_scheduler_thread()
+    # Indexes are normally built by the release step (flask ensure-indexes); opting in
+    # here builds them on a background thread so no request waits on it
+    if (os.getenv('ENSURE_INDEXES_ON_START') or 'false').lower() == 'true':
+        threading.Thread(target=_ensure_indexes_quietly, name='ensure-indexes', daemon=True).start()
+
+@app.before_request
+def start_background_services_on_first_request():
+    if not _background['started']:
+        start_background_services()
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create every index declared in indexes.py (safe to rerun; run on deploy)."""
+    for name, indexes in ensure_indexes().items():
+        click.echo(f"{name}: {', '.join(indexes)}")
+
+@app.cli.command('index-report')
+def index_report_command():
+    """List queries in app.py that no declared index supports."""
+    unindexed, undeclared = index_report()
+    for line, call, fields in unindexed:
+        click.echo(f"app.py:{line}  {call}  filter on {', '.join(fields)}")
+    for name in undeclared:
+        click.echo(f"col.py: {name} has no entry in indexes.INDEXES")
+    if not unindexed and not undeclared:
+        click.echo("Every literal query filter in app.py has a supporting index.")
+
+def master_import_target(test=False):
+    return test_collection if test or app.config['MODE'] != "PROD" else services_collection
+
+def finish_master_import(report, target):
+    """Refresh what a master-list import makes stale."""
+    if report['dry_run'] or not report['valid']:
+        return
+    if target is services_collection:
+        invalidate_counts(services_collection)
+        reference_data.invalidate('companies')
+        company_hierarchy.mark_stale(*report['companies'])
+
+@app.cli.command('import-services')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--sheet', help='Worksheet name (.xlsx only; default: the active sheet).')
+@click.option('--month', help='YYYY-MM for rows without a month_year or month/year column.')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows per bulk write.')
+@click.option('--dry-run', is_flag=True, help='Check every row and report errors without writing.')
+@click.option('--test', is_flag=True, help='Import into the test collection.')
+def import_services_command(path, sheet, month, batch_size, dry_run, test):
+    """Import a service list spreadsheet (.xlsx/.csv) into the master list."""
+    try:
+        default_month = parse_month(month)
+    except RowError as e:
+        raise click.BadParameter(str(e), param_hint='--month')
+    target = master_import_target(test)
+    try:
+        report = import_master_list(iter_rows(path, sheet=sheet), target, default_month,
+                                    batch_size=batch_size, dry_run=dry_run)
+    except SpreadsheetError as e:
+        raise click.ClickException(str(e))
+    finish_master_import(report, target)
+    for row_error in report['errors']:
+        click.echo(f"row {row_error['row']}: {row_error['error']}", err=True)
+    click.echo(f"{'Dry run: ' if dry_run else ''}{report['rows']} rows, {report['valid']} valid, "
+               f"{report['failed']} failed; {report['inserted']} inserted, {report['updated']} updated, "
+               f"{report['unchanged']} unchanged into {target.full_name} in {report['duration']}s")
+
+@app.cli.command('renumber-order')
+@click.argument('collection', type=click.Choice(['models', 'eos']))
+def renumber_order_command(collection):
+    """Renumber the display order of models (by model1) or EOs (by eo_name) alphabetically."""
+    if collection == 'models':
+        count = renumber_order(model_list_collection, 'model1')
+        reference_data.invalidate('models')
+    else:
+        count = renumber_order(eo_pack_collection, 'eo_name')
+        reference_data.invalidate('essential_oils')
+    click.echo(f"Renumbered {count} {collection}")
 
 @app.route('/update-data', methods=['POST'])
 def update_data():
@@ -45,7 +234,11 @@ def update_data():
     record_id = data.pop('sn')
     print("Record:", record_id)
     print("Object ID :", ObjectId)
+    previous = services_collection.find_one({'S/N': record_id}, {'company': 1}) or {}
     result = services_collection.update_one({'S/N': record_id}, {'$set': data})
+    invalidate_counts(services_collection)
+    reference_data.invalidate('companies')
+    company_hierarchy.mark_stale(previous.get('company'), data.get('company'))
     if result.modified_count > 0:
         return jsonify({'success': True})
     else:
@@ -64,10 +257,17 @@ def to_querystring(query_params):
 @app.template_filter('update_querystring')
 def update_querystring(querystring, key, value):
     """Updates or adds a key-value pair in the query string."""
-    query_dict = dict([kv.split('=') for kv in querystring.split('&') if '=' in kv])
+    query_dict = dict(parse_qsl(querystring, keep_blank_values=True))
     query_dict[key] = value
     return urlencode(query_dict)
 
+@app.template_filter('with_params')
+def with_params(query_params, **updates):
+    """Query string for the query_params dict with `updates` applied, encoded once (for page links)."""
+    params = dict(query_params)
+    params.update(updates)
+    return urlencode(params)
+
 
 # Routes
 @app.route("/customer-help", methods=["GET", "POST"])
@@ -78,9 +278,6 @@ def customer_form():
 
     # user_email = session["customer_email"] 
     if request.method == "POST":
-        # Auto-increment case number
-        case_no = collection.count_documents({}) + 1
-
         # Extract customer form data
         user_email = session["customer_email"]
         premise_name = request.form.get("premise_name")
@@ -91,12 +288,15 @@ def customer_form():
 
         # Handle image upload
         image = request.files.get('image')  # Get the image file from the form
-        image_id = None
-        if image:
-            filename = secure_filename(image.filename)
-            image_data = image.read()  # Read the file data
-            image_id = fs.put(image_data, filename=filename)  # Store the image in GridFS
+        try:
+            image_id = store_upload(fs, image)  # Stream the image into GridFS
+        except UploadError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("customer_form"))
+        image_variants.submit(image_id)
 
+        # Auto-increment case number only once the upload is stored, so a rejected upload doesn't burn one
+        case_no = case_numbers.next()
 
         # Insert new case into MongoDB
         collection.insert_one({
@@ -110,10 +310,18 @@ def customer_form():
             "email": user_email,
             "created_at": datetime.now(),
         })
+        invalidate_dashboard_metrics()
 
         # Send emails to the customer and admin
-        send_email_to_customer(case_no, user_email,app.config['MAIL_USERNAME'],mail)
-        send_email_to_admin(case_no,user_email,app.config['MAIL_USERNAME'],mail)
+        case_details = {
+            "premise_name": premise_name,
+            "device_location": location,
+            "issues": ", ".join(issues),
+            "remarks": remarks,
+        }
+        send_email_to_customer(case_no, user_email,app.config['MAIL_USERNAME'],mail_outbox_collection, **case_details)
+        send_email_to_admin(case_no, app.config['TEAM_EMAIL'], app.config['MAIL_USERNAME'], mail_outbox_collection,
+                            image_id=image_id, customer_email=user_email, **case_details)
         
 
         # Redirect to success page
@@ -186,6 +394,9 @@ def get_case_details(case_no):
     case_data = collection.find_one({"case_no": case_no}, {"_id": 0})  # Exclude _id for cleaner JSON
     if not case_data:
         return jsonify({"error": "Case not found"}), 404
+    for key in ("image_id", "signature_id"):
+        if case_data.get(key):
+            case_data[key] = str(case_data[key])
     return jsonify(case_data)
 
 @app.route("/staff-help/<int:case_no>", methods=["GET", "POST"])
@@ -207,13 +418,23 @@ def staff_form(case_no):
         revisit_date = request.form.get("appointment_date")
         revisit_time = request.form.get("appointment_time")
         staff_name = request.form.get("staff_name")
-        signature_data = request.form.get("signature")
+        # Signatures are stored once as PNGs in GridFS; an empty pad keeps the existing one
+        signature_id = store_signature(fs, db['fs.files'], request.form.get("signature")) or case_data.get("signature_id")
+        legacy_signature_id = None
+        if not signature_id:
+            # Convert a legacy inline signature; one that is not a PNG data URL stays where it is
+            legacy_signature_id = signature_id = store_signature(fs, db['fs.files'], case_data.get("signature"))
         image_id = case_data.get("image_id")  # Keep existing image if not changed
         if "image" in request.files:
             file = request.files["image"]
             if file and file.filename:
                 # Save new image to GridFS
-                image_id = fs.put(file.read(), filename=file.filename, content_type=file.content_type)
+                try:
+                    image_id = store_upload(fs, file)
+                except UploadError as e:
+                    flash(str(e), "danger")
+                    return redirect(url_for("staff_form", case_no=case_no))
+                image_variants.submit(image_id)
 
 
         # # Handle signature file upload (Use GridFS instead of local storage)
@@ -226,25 +447,26 @@ def staff_form(case_no):
         # If case is closed, remove it from MongoDB
         if case_closed == "Yes":
             collection.delete_one({"case_no": case_no})
+            invalidate_dashboard_metrics()
             flash(f"Case #{case_no} has been closed and removed.", "success")
             return render_template("view-complaint.html")
 
         # Update case in MongoDB
-        collection.update_one(
-            {"case_no": case_no},
-            {"$set": {
-                "actions_done": actions_done,
-                "remarks": remarks,
-                "case_closed": case_closed,
-                "revisit_date": revisit_date,
-                "revisit_time": revisit_time,
-                "staff_name": staff_name,
-                # "signature_id": signature_id,  # Store GridFS ID instead of local file path
-                "updated_at": datetime.now(),
-                "image_id": image_id,
-                 "signature": signature_data
-            }}
-        )
+        update = {"$set": {
+            "actions_done": actions_done,
+            "remarks": remarks,
+            "case_closed": case_closed,
+            "revisit_date": revisit_date,
+            "revisit_time": revisit_time,
+            "staff_name": staff_name,
+            "signature_id": signature_id,  # Store GridFS ID instead of the data URL
+            "updated_at": datetime.now(),
+            "image_id": image_id
+        }}
+        if legacy_signature_id:
+            # The inline copy now lives in GridFS
+            update["$unset"] = {"signature": ""}
+        collection.update_one({"case_no": case_no}, update)
 
         # Send Email Notification
         # msg = Message("Case Updated", sender=app.config['MAIL_USERNAME'], recipients=["team-email@example.com"])
@@ -299,6 +521,7 @@ def register():
             'email': email,
             'password': hashed_password
         })
+        invalidate_counts(login_cust_collection)
         
         flash("User registered successfully!", "success")
         log_activity(session["username"],"added user : " +str(email),logs_collection)
@@ -332,6 +555,7 @@ def register_admin():
             'username': username,
             'password': hashed_password
         })
+        invalidate_counts(login_collection)
         
         flash("User registered successfully!", "success")
         log_activity(session["username"],"added user : " +str(username),logs_collection)
@@ -351,6 +575,7 @@ def delete_user():
     email = user.get('email', 'Unknown')  # Get the username or default to 'Unknown'
 
     login_cust_collection.delete_one({'_id': ObjectId(user_id)})
+    invalidate_counts(login_cust_collection)
         
     flash("User deleted successfully!", "success")
     log_activity(session["username"], f"deleted user with email: {email}", logs_collection)
@@ -366,6 +591,7 @@ def delete_admin():
     user = login_collection.find_one({'_id': ObjectId(user_id)})
     username = user.get('username', 'Unknown')  # Get the username or default to 'Unknown'
     login_collection.delete_one({'_id': ObjectId(user_id)})
+    invalidate_counts(login_collection)
 
     flash("User deleted successfully!", "success")
     log_activity(session["username"], f"deleted user with username: {username}", logs_collection)
@@ -402,215 +628,10 @@ def reports():
         limit = int(request.args.get('limit', 20))  # Entries per page (default: 10)
 
 
-        # Get filter parameters
-        month = request.args.get('month','').strip()
-        year = request.args.get('year','').strip()
-        EO = request.args.get("EO")
-        Company = request.args.get("Company")
-        Model = request.args.get("Model")
-        Volume = request.args.get("Volume")
-        SN = request.args.get("SN")
-        Balance = request.args.get("Balance")
-        Consumption = request.args.get("Consumption")
-        Refilled = request.args.get("Refilled")
-        E1_Work = request.args.get("E1_Work")
-        E1_Pause = request.args.get("E1_Pause")
-        E1_Days = request.args.get("E1_Days")
-        E1_Start = request.args.get("E1_Start")
-        E1_End = request.args.get("E1_End")
-        E2_Work = request.args.get("E2_Work")
-        E2_Pause = request.args.get("E2_Pause")
-        E2_Days = request.args.get("E2_Days")
-        E2_Start = request.args.get("E2_Start")
-        E2_End = request.args.get("E2_End")
-        E3_Work = request.args.get("E3_Work")
-        E3_Pause = request.args.get("E3_Pause")
-        E3_Days = request.args.get("E3_Days")
-        E3_Start = request.args.get("E3_Start")
-        E3_End = request.args.get("E3_End")
-        E4_Work = request.args.get("E4_Work")
-        E4_Pause = request.args.get("E4_Pause")
-        E4_Days = request.args.get("E4_Days")
-        E4_Start = request.args.get("E4_Start")
-        E4_End = request.args.get("E4_End")
-        Model = request.args.get("Model")
-        Colour = request.args.get("Colour")
-        Current_EO = request.args.get("Current_EO")
-        New_EO = request.args.get("New_EO")
-        Scent_Effectiveness = request.args.get("Scent_Effectiveness")
-        Common_Encounters = request.args.get("Common_Encounters")
-        Other_Remarks = request.args.get("Other_Remarks")
-        # Filters
-        industry = request.args.get('industry', '').strip()
-        premise = request.args.get('premise', '').strip()
-        pic = request.args.get('pic', '').strip()
-
-        
-
-
-        query = {}
-        if month and year:
-            months = [int(m) for m in month.split(',')]
-            month_list = [int(m.strip()) for m in month.split(',') if m.strip().isdigit()]
-    
-            query['$expr'] = {
-                '$and': [
-                    {'$in': [{'$month': '$month_year'}, month_list]},
-                    {'$eq': [{'$year': '$month_year'}, int(year)]}
-                ]
-            }
-        
-       
-        
-        # Filter by EO (string partial match)
-
-        if industry:
-            query["industry"] = {'$regex': industry, '$options': 'i'}
-        if premise:
-            query["premise_name"] = {'$regex': premise, '$options': 'i'}
-        if pic:
-            query["name"] = {'$regex': pic, '$options': 'i'}
-
-        if EO:
-            query['Current EO'] = {'$regex': EO, '$options': 'i'}  # Case-insensitive partial match
+        # Build the query from the declarative master-list filter spec
+        query = compile_filters(MASTER_LIST_FILTERS, request.args, collation=CASE_INSENSITIVE)
 
-        if Model:
-            query['Model'] = {'$regex': Model, '$options': 'i'}  # Case-insensitive partial match
-
-        if Company:
-            query['company'] = {'$regex': Company, '$options': 'i'}  # Case-insensitive partial match
-
-
-        # Filter by Volume (integer exact match)
-        if Volume:
-            query['Volume'] = int(Volume)
-        
-        # Filter by SN (string partial match)
-        if SN:
-            query['S/N'] = int(SN)  # Case-insensitive partial match
-
-        # Filter by Balance (integer exact match)
-        if Balance:
-            query['Balance'] = int(Balance)
-
-        # Filter by Consumption (integer exact match)
-        if Consumption:
-            query['Consumption'] = int(Consumption)
-
-        # Filter by Refilled (integer exact match)
-        if Refilled:
-            query['Refilled'] = int(Refilled)
-
-        # Filter for E1 Work (integer exact match)
-        if E1_Work:
-            query['E1 - WORK'] = int(E1_Work)
-
-        # Filter for E1 Pause (integer exact match)
-        if E1_Pause:
-            query['E1 - PAUSE'] = int(E1_Pause)
-
-        # Filter for E1 Days (integer exact match)
-        if E1_Days:
-            query['E1 - DAYS'] = {'$regex': E1_Days, '$options': 'i'}
-
-        # Filter for E1 Start (integer exact match)
-        if E1_Start:
-            query['E1 - START'] = {'$regex': E1_Start, '$options': 'i'}
-
-        # Filter for E1 End (integer exact match)
-        if E1_End:
-            query['E1 - END'] = {'$regex': E1_End, '$options': 'i'}
-
-        # Filter for E2 Work (integer exact match)
-        if E2_Work:
-            query['E2 - WORK'] = int(E2_Work)
-
-        # Filter for E2 Pause (integer exact match)
-        if E2_Pause:
-            query['E2 - PAUSE'] = int(E2_Pause)
-
-        if E2_Days:
-            query['E2 - DAYS'] = {'$regex': E2_Days, '$options': 'i'}
-
-        # Filter for E1 Start (integer exact match)
-        if E2_Start:
-            query['E2 - START'] = {'$regex': E2_Start, '$options': 'i'}
-
-        # Filter for E1 End (integer exact match)
-        if E2_End:
-            query['E2 - END'] = {'$regex': E2_End, '$options': 'i'}
-
-        # Filter for E3 Work (integer exact match)
-        if E3_Work:
-            query['E3 - WORK'] = int(E3_Work)
-
-        # Filter for E3 Pause (integer exact match)
-        if E3_Pause:
-            query['E3 - PAUSE'] = int(E3_Pause)
-
-        # Filter for E3 Days (integer exact match)
-        if E3_Days:
-            query['E3 - DAYS'] = {'$regex': E3_Days, '$options': 'i'}
-
-        # Filter for E1 Start (integer exact match)
-        if E3_Start:
-            query['E3 - START'] = {'$regex': E3_Start, '$options': 'i'}
-
-        # Filter for E1 End (integer exact match)
-        if E3_End:
-            query['E3 - END'] = {'$regex': E3_End, '$options': 'i'}
-
-        # Filter for E4 Work (integer exact match)
-        if E4_Work:
-            query['E4 - WORK'] = int(E4_Work)
-
-        # Filter for E4 Pause (integer exact match)
-        if E4_Pause:
-            query['E4 - PAUSE'] = int(E4_Pause)
-
-        # Filter for E4 Days (integer exact match)
-        if E4_Days:
-            query['E4 - DAYS'] = {'$regex': E4_Days, '$options': 'i'}
-
-        # Filter for E1 Start (integer exact match)
-        if E4_Start:
-            query['E4 - START'] = {'$regex': E4_Start, '$options': 'i'}
-
-        # Filter for E1 End (integer exact match)
-        if E4_End:
-            query['E4 - END'] = {'$regex': E4_End, '$options': 'i'}
-
-        # Filter by Model (string partial match)
-        if Model:
-            query['Model'] = {'$regex': Model, '$options': 'i'}  # Case-insensitive partial match
-
-        # Filter by Colour (string partial match)
-        if Colour:
-            query['Color'] = {'$regex': Colour, '$options': 'i'}  # Case-insensitive partial match
-
-        # Filter by Current EO (string partial match)
-        if Current_EO:
-            query['Current EO'] = {'$regex': Current_EO, '$options': 'i'}  # Case-insensitive partial match
-
-        # Filter by New EO (string partial match)
-        if New_EO:
-            query['New EO'] = {'$regex': New_EO, '$options': 'i'}  # Case-insensitive partial match
-
-        # Filter by Scent Effectiveness (string partial match)
-        if Scent_Effectiveness:
-            query['#1 Scent Effectiveness'] = {'$regex': Scent_Effectiveness, '$options': 'i'}  # Case-insensitive partial match
-
-        # Filter by Common Encounters (string partial match)
-        if Common_Encounters:
-            query['#1 Common encounters'] = {'$regex': Common_Encounters, '$options': 'i'}  # Case-insensitive partial match
-
-        # Filter by Other Remarks (string partial match)
-        if Other_Remarks:
-            query['#1 Other remarks'] = {'$regex': Other_Remarks, '$options': 'i'}  # Case-insensitive partial match
-
-
-        
-        query_params = request.args.to_dict()
+        query_params = without_cursors(request.args.to_dict())
         query_params['page'] = page
         query_params['limit'] = limit
 
@@ -618,13 +639,15 @@ def reports():
         base_url = request.path
         pagination_base_url = f"{base_url}?"
         # Get total entries for pagination
-        total_entries = services_collection.count_documents(query)
+        total_entries = count_entries(services_collection, query, collation=CASE_INSENSITIVE, approximate=True)
         
 
         # Fetch data with pagination
-        services_collection_list = services_collection.find(query, {'_id': 0}) \
-                        .skip((page - 1) * limit) \
-                        .limit(limit)
+        services_collection_list, cursors = paginate(services_collection, query, page, limit,
+                                                     after=request.args.get('after'),
+                                                     before=request.args.get('before'),
+                                                     projection={'_id': 0},
+                                                     collation=CASE_INSENSITIVE)
 
         # Add month and year fields to the data
         processed_data = []
@@ -649,6 +672,8 @@ def reports():
                                page=page, 
                                total_pages=total_pages,
                                limit=limit,
+                               cursors=cursors,
+                               approximate_total=True,
                                pagination_base_url=pagination_base_url,
                                query_params=query_params
                                )
@@ -792,40 +817,52 @@ def pack_list():
         if devices:
             device_query['devices'] = {'$regex': devices, '$options': 'i'}
 
-        query_params = request.args.to_dict()
+        query_params = without_cursors(request.args.to_dict())
         query_params['page'] = page
         query_params['limit'] = limit
         base_url = request.path
         pagination_base_url = f"{base_url}?"
 
-        query_params_device = request.args.to_dict()
+        query_params_device = without_cursors(request.args.to_dict(), 'device_')
         query_params_device['device_page'] = device_page
         query_params_device['device_limit'] = device_limit
         base_url_device = request.path
         pagination_base_url_device = f"{base_url_device}?"
 
-        query_params_bottle = request.args.to_dict()
+        query_params_bottle = without_cursors(request.args.to_dict(), 'bottle_')
         query_params_bottle['bottle_page'] = bottle_page
         query_params_bottle['bottle_limit'] = bottle_limit
         base_url_bottle = request.path
         pagination_base_url_bottle = f"{base_url_bottle}?"
 
-        query_params_straw = request.args.to_dict()
+        query_params_straw = without_cursors(request.args.to_dict(), 'straw_')
         query_params_straw['straw_page'] = straw_page
         query_params_straw['straw_limit'] = straw_limit
         base_url_straw = request.path
         pagination_base_url_straw = f"{base_url_straw}?"
 
 
-        total_page = eo_pack_collection.count_documents(query)
-        total_device_page = others_list_collection.count_documents(device_query)
-        total_bottle_page = empty_bottles_list_collection.count_documents(bottle_query)
-        total_straw_page = straw_list_collection.count_documents(other_query)
+        total_page = count_entries(eo_pack_collection, query)
+        total_device_page = count_entries(others_list_collection, device_query)
+        total_bottle_page = count_entries(empty_bottles_list_collection, bottle_query)
+        total_straw_page = count_entries(straw_list_collection, other_query)
     
-        data_eo_pack_list = eo_pack_collection.find(query, {'_id':0}).skip((page-1)*limit).limit(limit)
-        data_device_pack_list = others_list_collection.find(device_query, {'_id':0}).skip((device_page-1)*device_limit).limit(device_limit)
-        data_bottle_pack_list = empty_bottles_list_collection.find(bottle_query, {'_id':0}).skip((bottle_page-1)*bottle_limit).limit(bottle_limit)
-        data_other_pack_list = straw_list_collection.find(other_query, {'_id':0}).skip((straw_page-1)*straw_limit).limit(straw_limit)
+        data_eo_pack_list, cursors = paginate(eo_pack_collection, query, page, limit,
+                                              after=request.args.get('after'),
+                                              before=request.args.get('before'),
+                                              projection={'_id': 0})
+        data_device_pack_list, device_cursors = paginate(others_list_collection, device_query, device_page, device_limit,
+                                                         after=request.args.get('device_after'),
+                                                         before=request.args.get('device_before'),
+                                                         projection={'_id': 0})
+        data_bottle_pack_list, bottle_cursors = paginate(empty_bottles_list_collection, bottle_query, bottle_page, bottle_limit,
+                                                         after=request.args.get('bottle_after'),
+                                                         before=request.args.get('bottle_before'),
+                                                         projection={'_id': 0})
+        data_other_pack_list, straw_cursors = paginate(straw_list_collection, other_query, straw_page, straw_limit,
+                                                       after=request.args.get('straw_after'),
+                                                       before=request.args.get('straw_before'),
+                                                       projection={'_id': 0})
 
        
         processed_data_eo_pack_list = []
@@ -886,6 +923,10 @@ def pack_list():
                                page=page, 
                                total_pages=total_pages,
                                limit=limit,
+                               cursors=cursors,
+                               device_cursors=device_cursors,
+                               bottle_cursors=bottle_cursors,
+                               straw_cursors=straw_cursors,
                                pagination_base_url=pagination_base_url,
                                query_params=query_params,
                                pagination_base_url_device=pagination_base_url_device,
@@ -973,28 +1014,33 @@ def eo_list():
         if volume:
             query['Volume'] = int(volume)
 
-        query_params = request.args.to_dict()
+        query_params = without_cursors(request.args.to_dict())
         query_params['page'] = page
         query_params['limit'] = limit
         base_url = request.path
         pagination_base_url = f"{base_url}?"
 
-        query_params_model = request.args.to_dict()
+        query_params_model = without_cursors(request.args.to_dict(), 'model_')
         query_params_model['model_page'] = model_page
         query_params_model['model_limit'] = model_limit
         base_url_model = request.path
         pagination_base_url_model = f"{base_url_model}?"
 
         # Get total entries for pagination
-        total_entries_eo_list = eo_list_collection.count_documents(query)
-        total_entries_model_list = model_list_collection.count_documents(model_query)
+        total_entries_eo_list = count_entries(eo_list_collection, query)
+        total_entries_model_list = count_entries(model_list_collection, model_query)
         
 
         # Fetch data with pagination
-        data_eo_list = eo_list_collection.find(query, {'_id': 0}) \
-                        .skip((page - 1) * limit) \
-                        .limit(limit)
-        data_model_list = model_list_collection.find(model_query, {'_id':0}).skip((model_page-1)*model_limit).limit(model_limit)
+        data_eo_list, cursors = paginate(eo_list_collection, query, page, limit,
+                                         after=request.args.get('after'),
+                                         before=request.args.get('before'),
+                                         projection={'_id': 0})
+        data_model_list, model_cursors = paginate(model_list_collection, model_query, model_page, model_limit,
+                                                  after=request.args.get('model_after'),
+                                                  before=request.args.get('model_before'),
+                                                  sort_key='order',
+                                                  projection={'_id': 0})
 
         # Add month and year fields to the data
         processed_data_eo_list = []
@@ -1027,6 +1073,8 @@ def eo_list():
                                total_pages=total_pages,
                                model_limit=model_limit, 
                                limit=limit,
+                               cursors=cursors,
+                               model_cursors=model_cursors,
                                pagination_base_url=pagination_base_url,
                                query_params=query_params,
                                pagination_base_url_model=pagination_base_url_model,
@@ -1040,26 +1088,22 @@ def eo_list():
 @app.route("/dashboard")
 def dashboard():
     if "username" in session:
-        remarks = list(remark_collection.find({}))  # Fetch all remarks from MongoDB
-        urgent_remarks = [r for r in remarks if r.get('urgent')]
-        non_urgent_remarks = [r for r in remarks if not r.get('urgent')]
-        help_request = list(collection.find({}))
-        change = list(change_collection.find({}))
-        refund = list(refund_collection.find({}))
+        metrics = get_dashboard_metrics()
 
-        
         return render_template("dashboard.html", 
                                username=session["username"], 
-                               remarks_count=len(non_urgent_remarks), 
-                               urgent_remarks_count=len(urgent_remarks),
-                               help_request_count=len(help_request),
-                               change_count = len(change),
-                               refund_count=len(refund)
+                               **metrics
                                )
     else:
         flash("Please log in to access this page.", "warning")
         return redirect(url_for("login"))
 
+@app.route("/dashboard-metrics")
+def dashboard_metrics():
+    if "username" not in session:
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(get_dashboard_metrics())
+
 
 @app.route('/change-form', methods=['GET', 'POST'])
 def change_form():
@@ -1105,14 +1149,14 @@ def change_form():
         else:
             change_collection.insert_one(data)
             log_activity(session["username"],"updated settings : " +str(data['premises']) + str(data['devices']),logs_collection)
-
+        invalidate_dashboard_metrics()
 
         # return jsonify({"message": "Form submitted successfully!"}), 200
         flash("Data updated", "success")
 
         return redirect(url_for("dashboard"))
 
-    companies = services_collection.distinct('company')
+    companies = reference_data.get('companies')
     # premises = services_collection.distinct('Premise Name')
     # devices = services_collection.distinct('Model')
 
@@ -1172,183 +1216,79 @@ def client_login():
 @app.route('/image2/<image_id>')
 def get_image2(image_id):
     """Route to retrieve and display an image from GridFS"""
-    image = fs.get(ObjectId(image_id))  # Fetch the image from GridFS
-    return send_file(image, mimetype='image/jpeg')  # Return the image as a response
+    return send_gridfs_file(fs, image_id, default_mimetype='image/jpeg', variant=request.args.get('variant'))
 
 #Getting the image later on frontend
 #<img src="{{ url_for('get_image', image_id=case['image_id']) }}" alt="Case Image" />
 
+@app.route('/import-services', methods=['GET', 'POST'])
+def import_services():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
+    report = None
+    if request.method == "POST":
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash("Choose a spreadsheet to import.", "danger")
+            return redirect(url_for("import_services"))
+        dry_run = bool(request.form.get('dry_run'))
+        target = master_import_target(bool(request.form.get('test')))
+        try:
+            month = parse_month(request.form.get('month'))
+            report = import_master_list(iter_rows(upload.stream, upload.filename, request.form.get('sheet') or None),
+                                        target, month, dry_run=dry_run)
+        except (SpreadsheetError, RowError) as e:
+            flash(str(e), "danger")
+            return redirect(url_for("import_services"))
+        finish_master_import(report, target)
+        if not dry_run:
+            log_activity(session["username"], f"imported service list {upload.filename}: "
+                         f"{report['inserted']} inserted, {report['updated']} updated, {report['failed']} failed",
+                         logs_collection)
+    return render_template('import-services.html', report=report)
+
 @app.route('/new-customer',methods=['GET', 'POST'])
 def new_customer():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    raw_models = list(model_list_collection.find().sort("order", 1))
-    models = [{k: v for k, v in model.items() if k != '_id'} for model in raw_models]
-
-    eo_raw = list(eo_pack_collection.find().sort("order", 1))
-    essential_oils = [{k: v for k, v in eo.items() if k != '_id'} for eo in eo_raw]
+    models = reference_data.get('models')
+    essential_oils = reference_data.get('essential_oils')
 
 
     
     if request.method == "POST":
-        # Extract and format date
-        date_str = request.form.get("dateCreated")
-        dateCreated = datetime.strptime(date_str, "%Y-%m-%d") if date_str else None  
-
-        companyName = request.form.get("companyName")
-        industry = request.form.get("industry")
-
-        # Initialize lists
-        premises = []
-        pic_records = []
-        device_records = []
-        master_list = []
-
-        if companyName:
-            premise_map = {}  # Store premises for lookup
-            pic_map = {}  # Store PICs tied to premises
-
-            # Step 1: Extract Premises
-            k = 1
-            while True:
-                premise_name = request.form.get(f'premiseName{k}')
-                premise_area = request.form.get(f'premiseArea{k}')
-                premise_address = request.form.get(f'premiseAddress{k}')
-
-                if not premise_name:
-                    break
-                
-                premise_record = {
-                    "company": companyName,
-                    "month_year": datetime.now(),
-                    "industry": industry,
-                    "premise_name": premise_name,
-                    "premise_area": premise_area,
-                    "premise_address": premise_address,
-                    "created_at": datetime.now(),
-                }
-                premises.append(premise_record)
-                premise_map[premise_name] = premise_record  # Store for lookup
-
-                k += 1
-
-            # Step 2: Extract PICs and Store by Premise
-            i = 1
-            while True:
-                pic_name = request.form.get(f'picName{i}')
-                pic_designation = request.form.get(f'picDesignation{i}')
-                pic_contact = request.form.get(f'picContact{i}')
-                pic_email = request.form.get(f'picEmail{i}')
-                contact_premise = request.form.get(f'contactPremise{i}')  # Premise linked to this PIC
-
-                if not pic_name:
-                    break
-
-                picdata = {
-                    "company": companyName,
-                    "tied_to_premise": contact_premise,
-                    "name": pic_name,
-                    "designation": pic_designation,
-                    "contact": pic_contact,
-                    "email": pic_email,
-                    "created_at": datetime.now(),
-                }
-                pic_records.append(picdata)
-
-                if contact_premise:
-                    if contact_premise == "all":
-                        for pname in premise_map.keys():
-                            if pname not in pic_map:
-                                pic_map[pname] = []
-                            pic_map[pname].append(picdata)
-                    else:
-                        if contact_premise not in pic_map:
-                            pic_map[contact_premise] = []
-                        pic_map[contact_premise].append(picdata)
-                i += 1  # Move to the next PIC
-
-            # Step 3: Extract Devices and Build Master List
-            j = 1
-            while True:
-                device_location = request.form.get(f'deviceLocation{j}')
-                device_sn = request.form.get(f'deviceSN{j}')
-                device_model = request.form.get(f'deviceModel{j}')
-                device_colour = request.form.get(f'deviceColour{j}')
-                device_volume = request.form.get(f'deviceVolume{j}')
-                device_scent = request.form.get(f'deviceScent{j}')
-                device_premise = request.form.get(f'devicePremise{j}')  # Premise linked to this device
-
-                if not device_sn:
-                    break
-
-                devicedata = {
-                    "company": companyName,
-                    "tied_to_premise": device_premise,
-                    "location": device_location,
-                    "S/N": safe_int(device_sn),
-                    "Model": device_model,
-                    "Color": device_colour,
-                    "Volume": safe_int(device_volume),
-                    "Current EO": device_scent,
-                    "E1 - DAYS": request.form.get(f"E1Days{j}"),
-                    "E1 - START": request.form.get(f"E1StartTime{j}"),
-                    "E1 - END": request.form.get(f"E1EndTime{j}"),
-                    "E1 - PAUSE": safe_int(request.form.get(f"E1Pause{j}")),
-                    "E1 - WORK": safe_int(request.form.get(f"E1Work{j}")),
-                    "E2 - DAYS": request.form.get(f"E2Days{j}"),
-                    "E2 - START": request.form.get(f"E2StartTime{j}"),
-                    "E2 - END": request.form.get(f"E2EndTime{j}"),
-                    "E2 - PAUSE": safe_int(request.form.get(f"E2Pause{j}")),
-                    "E2 - WORK": safe_int(request.form.get(f"E2Work{j}")),
-                    "E3 - DAYS": request.form.get(f"E3Days{j}"),
-                    "E3 - START": request.form.get(f"E3StartTime{j}"),
-                    "E3 - END": request.form.get(f"E3EndTime{j}"),
-                    "E3 - PAUSE": safe_int(request.form.get(f"E3Pause{j}")),
-                    "E3 - WORK": safe_int(request.form.get(f"E3Work{j}")),
-                    "E4 - DAYS": request.form.get(f"E4Days{j}"),
-                    "E4 - START": request.form.get(f"E4StartTime{j}"),
-                    "E4 - END": request.form.get(f"E4EndTime{j}"),
-                    "E4 - PAUSE": safe_int(request.form.get(f"E4Pause{j}")),
-                    "E4 - WORK": safe_int(request.form.get(f"E4Work{j}")),
-                    "created_at": datetime.now(),
-                }
-                device_records.append(devicedata)
-
-                # Generate master records (each PIC gets its own row)
-                assigned_pics = pic_map.get(device_premise, [{}])  # Get all PICs for this premise
-                for pic in assigned_pics:
-                    master_record = {
-                        "company": companyName,
-                        "industry": industry,
-                        "month_year": dateCreated,
-                        **premise_map.get(device_premise, {}),  # Attach premise details
-                        **pic,  # Attach one PIC per entry
-                        **devicedata  # Attach device details
-                    }
-                    master_list.append(master_record)
-
-                j += 1  # Move to the next device
-
-        # Insert into MongoDB
-        if premises:
-            profile_list_collection.insert_many(premises)
-
-        if pic_records:
-            profile_list_collection.insert_many(pic_records)  # Store PICs separately
-
-        if device_records:
-            device_list_collection.insert_many(device_records)  # Store devices separately
+        payload = parse_onboarding_form(request.form)
 
-        if master_list:
-            if app.config['MODE'] == "PROD":
-                services_collection.insert_many(master_list)
-            else:
-                test_collection.insert_many(master_list)  # Store in test collection
-
-        log_activity(session["username"], f"added new customer: {companyName}", logs_collection)
-
-        flash(f"Company {companyName} added successfully!", "success")
+        # Optional spreadsheet of devices (one row per device) on top of any entered in the form
+        devices_file = request.files.get('devicesFile')
+        if devices_file and devices_file.filename:
+            try:
+                add_spreadsheet_devices(payload, iter_rows(devices_file.stream, devices_file.filename))
+            except SpreadsheetError as e:
+                flash(str(e), "danger")
+                return redirect(url_for("new_customer"))
+
+        errors = validate_onboarding(payload, device_list_collection)
+        if errors:
+            for error in errors[:MAX_REPORTED_ERRORS]:
+                flash(error, "danger")
+            if len(errors) > MAX_REPORTED_ERRORS:
+                flash(f"...and {len(errors) - MAX_REPORTED_ERRORS} more problems. Nothing was saved.", "danger")
+            return redirect(url_for("new_customer"))
+
+        companyName = payload['company']
+        master_collection = services_collection if app.config['MODE'] == "PROD" else test_collection
+        counts = write_onboarding(payload, profile_list_collection, device_list_collection, master_collection)
+
+        if app.config['MODE'] == "PROD":
+            invalidate_counts(services_collection)
+            reference_data.invalidate('companies')
+        company_hierarchy.mark_stale(companyName)
+        log_activity(session["username"], f"added new customer: {companyName} ({counts['devices']} devices)", logs_collection)
+
+        flash(f"Company {companyName} added successfully with {counts['devices']} devices!", "success")
 
         return redirect(url_for("new_customer"))
     return render_template('new-customer.html', models=models, essential_oils=essential_oils)
@@ -1359,7 +1299,7 @@ def new_customer():
 def pre_service():
     if "username" not in session:
         return redirect(url_for('login'))
-    companies = services_collection.distinct('company')
+    companies = reference_data.get('companies')
     
 
     if request.method == 'POST':
@@ -1379,7 +1319,10 @@ def pre_service():
             "premise": request.form.get('premise'),
             "model": request.form.get('model'),
             "color": request.form.get('color'),
-            "eo": request.form.get('eo')
+            "eo": request.form.get('eo'),
+            # Key the monthly rollover matches on
+            "year": date_obj.year if date_obj else None,
+            "month": date_obj.month if date_obj else None
         }
         route_list_collection.insert_one(entry)
 
@@ -1387,7 +1330,7 @@ def pre_service():
 
         log_activity(session["username"],"pre-service : " +str(request.form.get('company')) + " : " +str(request.form.get('premise')),logs_collection)
 
-        companies = services_collection.distinct('company')
+        companies = reference_data.get('companies')
         return render_template('pre-service.html', companies=companies)
     return render_template('pre-service.html', companies=companies)
     
@@ -1397,28 +1340,30 @@ def pre_service():
 #     premises = services_collection.find({"company": company}, {"Premise Name": 1, "_id": 0})
 #     return jsonify([p['Premise Name'] for p in premises])
 
+@app.route('/company-hierarchy/<company>')
+def get_company_hierarchy(company):
+    """A company's whole premise -> model -> color -> EO tree, with each premise's devices, in one response."""
+    return jsonify(company_hierarchy.get(company))
+
+def _premise_models(premise):
+    # ?company= narrows a premise name shared by several companies; without it their trees are merged
+    entry = company_hierarchy.find_premise(premise, request.args.get('company'))
+    return entry['models'] if entry else []
+
+def _model_colors(premise, model):
+    return next((m['colors'] for m in _premise_models(premise) if m['name'] == model), [])
+
 @app.route('/get-models/<premise>')
 def get_models(premise):
-    models = services_collection.find({"Premise Name": premise}, {"Model": 1, "_id": 0})
-    return jsonify([m['Model'] for m in models])
+    return jsonify([m['name'] for m in _premise_models(premise)])
 
 @app.route('/get-colors/<model>/<premise>')
 def get_colors(model, premise):
-    colors = services_collection.find(
-        {"Model": model, "Premise Name": premise},  # Ensure it's the same document
-        {"Color": 1, "_id": 0}
-    )
-    unique_colors = list(set(c.get('Color') for c in colors if c.get('Color')))  # Ensure no NaN
-    return jsonify(unique_colors)
+    return jsonify([c['name'] for c in _model_colors(premise, model)])
 
 @app.route('/get-eo/<model>/<premise>/<color>')
 def get_eo(model, premise, color):
-    eos = services_collection.find(
-        {"Model": model, "Premise Name": premise, "Color": color},  # Exact match
-        {"Current EO": 1, "_id": 0}
-    )
-    unique_eos = list(set(e.get('Current EO') for e in eos if e.get('Current EO')))  # Ensure no NaN
-    return jsonify(unique_eos)
+    return jsonify(next((c['eos'] for c in _model_colors(premise, model) if c['name'] == color), []))
 
 
 
@@ -1441,6 +1386,7 @@ def remark():
             'remark': remark_text,
             'urgent': is_urgent
         })
+        invalidate_dashboard_metrics()
         return redirect(url_for('dashboard'))
 
     return render_template('remark.html', username=username)
@@ -1466,16 +1412,13 @@ def get_devices1():
 
 @app.route("/get_companies", methods=["GET"])
 def get_companies():
-    companies = services_collection.find({}, {"company": 1, "_id": 0})
-    unique_companies = sorted({company.get("company") for company in companies if "company" in company})
-    return jsonify(unique_companies)
+    return jsonify(reference_data.get('companies'))
 
 
 
 @app.route("/get_essential_oils", methods=["GET"])
 def get_essential_oils():
-    essential_oils = eo_pack_collection.find({}, {"eo_name": 1, "_id": 0})
-    return jsonify([eo["eo_name"] for eo in essential_oils])
+    return jsonify([eo["eo_name"] for eo in reference_data.get('essential_oils') if "eo_name" in eo])
 
 
 
@@ -1529,6 +1472,8 @@ def post_service():
 
         # Perform the upsert (update or insert if not found)
         eo_pack_collection.update_one(query, update, upsert=True)
+        invalidate_counts(eo_pack_collection)
+        reference_data.invalidate('essential_oils')
 
         # Log the activity
         log_activity(username, f"Updated/added post-service record for essential oil: {essential_oil}", logs_collection)
@@ -1542,8 +1487,6 @@ def post_service():
 def view_users():
     if 'username' not in session:
         return redirect(url_for('login'))
-    
-    users = list(login_cust_collection.find({}, {'username': 1,'email':1}))
 
     page = int(request.args.get('page', 1))  # Current page (default: 1)
     limit = int(request.args.get('limit', 20))  # Entries per page (default: 10)
@@ -1562,20 +1505,19 @@ def view_users():
         query["email"] = {"$regex": email, "$options": "i"}  # Case-insensitive search
 
     # Pagination logic
-    total_list = login_cust_collection.count_documents(query)
+    total_list = count_entries(login_cust_collection, query)
 
-    users = list(
-        login_cust_collection.find(query, {'username': 1, 'email': 1, '_id': 1})
-        .skip((page - 1) * limit)
-        .limit(limit)
-    )
+    users, cursors = paginate(login_cust_collection, query, page, limit,
+                              after=request.args.get('after'),
+                              before=request.args.get('before'),
+                              projection={'username': 1, 'email': 1, '_id': 1})
 
     for user in users:
         user['_id'] = str(user['_id'])  
 
     total_pages = (total_list + limit - 1) // limit
     base_url = request.path
-    query_params = request.args.to_dict()
+    query_params = without_cursors(request.args.to_dict())
     query_params['page'] = page
     query_params['limit'] = limit
     pagination_base_url = f"{base_url}?"
@@ -1585,6 +1527,7 @@ def view_users():
                            page=page, 
                            total_pages=total_pages,
                            limit=limit,
+                           cursors=cursors,
                            pagination_base_url=pagination_base_url,
                            query_params=query_params,
                            )
@@ -1593,9 +1536,6 @@ def view_users():
 def view_admins():
     if 'username' not in session:
         return redirect(url_for('login'))
-    
-    admins = list(login_collection.find({}, {'username': 1}))
-
 
 
     page = int(request.args.get('page', 1))  # Current page (default: 1)
@@ -1609,13 +1549,12 @@ def view_admins():
     if username:
         query["username"] = {"$regex": username, "$options": "i"}  # Case-insensitive search
     
-    total_list = login_collection.count_documents(query)
+    total_list = count_entries(login_collection, query)
 
-    admins = list(
-        login_collection.find(query, {'username': 1,  '_id': 1})
-        .skip((page - 1) * limit)
-        .limit(limit)
-    )
+    admins, cursors = paginate(login_collection, query, page, limit,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'),
+                               projection={'username': 1, '_id': 1})
 
     for admin in admins:
         admin['_id'] = str(admin['_id'])  
@@ -1623,7 +1562,7 @@ def view_admins():
 
     total_pages = (total_list + limit - 1) // limit
     base_url = request.path
-    query_params = request.args.to_dict()
+    query_params = without_cursors(request.args.to_dict())
     query_params['page'] = page
     query_params['limit'] = limit
     pagination_base_url = f"{base_url}?"
@@ -1635,6 +1574,7 @@ def view_admins():
                            page=page, 
                            total_pages=total_pages,
                            limit=limit,
+                           cursors=cursors,
                            pagination_base_url=pagination_base_url,
                            query_params=query_params,
                            )
@@ -1645,80 +1585,30 @@ def get_logs():
     if 'username' not in session:
         return redirect(url_for('login'))
 
-    logs = list(logs_collection.find({}).sort("timestamp", -1)) 
-    
-    formatted_logs = []
-    for log in logs:
-        timestamp = log.get("timestamp")
-        if isinstance(timestamp, str):  # If timestamp is already a string
-            dt_object = datetime.fromisoformat(timestamp)
-        elif isinstance(timestamp, datetime):  # If timestamp is a datetime object
-            dt_object = timestamp
-        else:
-            continue  # Skip log if timestamp is invalid
-        
-        formatted_logs.append({
-            "user": log.get("user"),
-            "action": log.get("action"),
-            "date": dt_object.strftime("%Y-%m-%d"),
-            "time": dt_object.strftime("%H:%M:%S")
-        })
-
     page = int(request.args.get('page', 1))  # Current page (default: 1)
     limit = int(request.args.get('limit', 20))  # Entries per page (default: 10)
 
-    date = request.args.get('date','').strip()
-    time = request.args.get('time','').strip()
-    user = request.args.get('user')
-    action = request.args.get('action')
-
-    query = {}
-
-    # Filter by date and time
-    if date and time:
-        try:
-            datetime_start = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-            datetime_end = datetime_start.replace(second=59)  # Include the entire minute
-            query["timestamp"] = {"$gte": datetime_start, "$lte": datetime_end}
-        except ValueError:
-            pass  # Ignore invalid date/time inputs
-
-    elif date:
-        try:
-            date_start = datetime.strptime(date, "%Y-%m-%d")
-            date_end = date_start.replace(hour=23, minute=59, second=59)  # End of day
-            query["timestamp"] = {"$gte": date_start, "$lte": date_end}
-        except ValueError:
-            pass  # Ignore invalid date inputs
-
-    # Filter by user
-    if user:
-        query["user"] = {"$regex": user, "$options": "i"}  # Case-insensitive search
-
-    # Filter by action
-    if action:
-        query["action"] = {"$regex": action, "$options": "i"}  # Case-insensitive search
+    query = build_log_query(request.args)
 
     # Pagination logic
-    total_list = logs_collection.count_documents(query)
+    total_list = count_entries(logs_collection, query, approximate=True)
 
-    data_logs_list = logs_collection.find(query).sort("timestamp", -1) \
-                        .skip((page - 1) * limit) \
-                        .limit(limit)
+    data_logs_list, cursors = paginate(logs_collection, query, page, limit,
+                                       after=request.args.get('after'),
+                                       before=request.args.get('before'),
+                                       sort_key='timestamp',
+                                       direction=DESCENDING)
 
     # Format logs for frontend
     processed_data_logs_list = []
     for log in data_logs_list:
-        timestamp = log.get("timestamp")
-        if isinstance(timestamp, datetime):
-            log["date"] = timestamp.strftime("%Y-%m-%d")
-            log["time"] = timestamp.strftime("%H:%M:%S")
+        format_log(log)
         processed_data_logs_list.append(log)
 
     # Pagination details
     total_pages = (total_list + limit - 1) // limit
     base_url = request.path
-    query_params = request.args.to_dict()
+    query_params = without_cursors(request.args.to_dict())
     query_params['page'] = page
     query_params['limit'] = limit
     pagination_base_url = f"{base_url}?"
@@ -1726,15 +1616,33 @@ def get_logs():
     
     return render_template('activity-log.html', 
                             username=session["username"],
-                            logs=formatted_logs,
                             data=processed_data_logs_list,
                             page=page, 
                             total_pages=total_pages,
                             limit=limit,
+                            cursors=cursors,
+                            approximate_total=True,
                             pagination_base_url=pagination_base_url,
                             query_params=query_params,
                            )
 
+@app.route('/logs/export', methods=['GET'])
+def export_logs():
+    if 'username' not in session:
+        return redirect(url_for('login'))
+
+    query = build_log_query(request.args)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    if request.args.get('format') == 'ndjson':
+        body, mimetype, filename = export_logs_ndjson(logs_collection, query), 'application/x-ndjson', f"activity-log-{stamp}.ndjson"
+    else:
+        body, mimetype, filename = export_logs_csv(logs_collection, query), 'text/csv', f"activity-log-{stamp}.csv"
+
+    log_activity(session["username"], f"exported activity log ({filename})", logs_collection)
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
 @app.route('/profile', methods=['GET','POST'])
 def profile():
     if 'username' not in session:
@@ -1745,84 +1653,14 @@ def profile():
     limit = int(request.args.get('limit', 20))
 
     # Filters
-    company = request.args.get('company', '').strip()
-    industry = request.args.get('industry', '').strip()
-    premise = request.args.get('premise', '').strip()
+    query = compile_filters(PROFILE_FILTERS, request.args)
     pic = request.args.get('pic', '').strip()
-    month = request.args.get('month', '').strip()
-    year = request.args.get('year', '').strip()
-
-    # MongoDB query filter
-    query = {}
-    if company:
-        query["company"] = {'$regex': company, '$options': 'i'}
-    if industry:
-        query["industry"] = {'$regex': industry, '$options': 'i'}
-    if premise:
-        query["premise_name"] = {'$regex': premise, '$options': 'i'}
-    if pic:
-        query["name"] = {'$regex': pic, '$options': 'i'}
-
-    # Filter by month and year from created_at
-    if month and year:
-        month_list = [int(m.strip()) for m in month.split(',') if m.strip().isdigit()]
-        query['$expr'] = {
-            '$and': [
-                {'$in': [{'$month': '$created_at'}, month_list]},
-                {'$eq': [{'$year': '$created_at'}, int(year)]}
-            ]
-        }
-
-    # Fetch records from MongoDB
-    records = list(profile_list_collection.find(query))
-
-    # Dictionary to store grouped data
-    grouped_data = defaultdict(lambda: {
-        "company": "",
-        "industry": "",
-        "premise_name": "",
-        "premise_area": "",
-        "premise_address": "",
-        "month": "",  # Store month separately
-        "year": "",
-        "pics": []
-    })
 
-    for record in records:
-        created_at = record.get("created_at")
-        month_year = created_at.strftime("%B %Y") if isinstance(created_at, datetime) else ""
-
-        if "premise_name" in record:
-            key = (record["company"], record["premise_name"])
-            grouped_data[key].update({
-                "company": record["company"],
-                "industry": record.get("industry", ""),
-                "premise_name": record["premise_name"],
-                "premise_area": record.get("premise_area", ""),
-                "premise_address": record.get("premise_address", ""),
-                "month": created_at.month if created_at else "",
-                "year": created_at.year if created_at else ""
-            })
-
-        elif "tied_to_premise" in record:
-            key = (record["company"], record["tied_to_premise"])
-            grouped_data[key]["pics"].append({
-                "name": record["name"],
-                "designation": record.get("designation", ""),
-                "contact": record.get("contact", ""),
-                "email": record.get("email", ""),
-            })
-
-    # Convert dictionary to list for pagination
-    structured_data = list(grouped_data.values())
-
-    # Pagination logic applied after processing data
-    total_records = len(structured_data)
+    # Group premises with their PICs and page inside Mongo
+    pipeline = profile_page_pipeline(profile_list_collection.name, query, pic, page, limit)
+    paginated_data, total_records = run_facet(profile_list_collection, pipeline)
     total_pages = (total_records + limit - 1) // limit
 
-    # Apply slicing for pagination
-    paginated_data = structured_data[(page - 1) * limit: page * limit]
-
     # URL for pagination links
     base_url = request.path
     query_params = request.args.to_dict()
@@ -1850,190 +1688,12 @@ def view_device():
     limit = int(request.args.get('limit', 20))
 
     # Filters
-    company = request.args.get('company', '').strip()
-    tied_to_premise = request.args.get('tied_to_premise', '').strip()
-    location = request.args.get('location', '').strip()
-    sn = request.args.get('sn', '').strip()
-    model = request.args.get('model', '').strip()
-    color = request.args.get('color', '').strip()
-    current_eo = request.args.get('current_eo', '').strip()
-    e1_days = request.args.get('e1_days', '').strip()
-    e1_start = request.args.get('e1_start', '').strip()
-    e1_end = request.args.get('e1_end', '').strip()
-    e1_pause = request.args.get('e1_pause', '').strip()
-    e1_work = request.args.get('e1_work', '').strip()
-    e2_days = request.args.get('e2_days', '').strip()
-    e2_start = request.args.get('e2_start', '').strip()
-    e2_end = request.args.get('e2_end', '').strip()
-    e2_pause = request.args.get('e2_pause', '').strip()
-    e2_work = request.args.get('e2_work', '').strip()
-    e3_days = request.args.get('e3_days', '').strip()
-    e3_start = request.args.get('e3_start', '').strip()
-    e3_end = request.args.get('e3_end', '').strip()
-    e3_pause = request.args.get('e3_pause', '').strip()
-    e3_work = request.args.get('e3_work', '').strip()
-    e4_days = request.args.get('e4_days', '').strip()
-    e4_start = request.args.get('e4_start', '').strip()
-    e4_end = request.args.get('e4_end', '').strip()
-    e4_pause = request.args.get('e4_pause', '').strip()
-    e4_work = request.args.get('e4_work', '').strip()
-    month = request.args.get('month', '').strip()
-    year = request.args.get('year', '').strip()
+    query = compile_filters(DEVICE_FILTERS, request.args)
 
-    # MongoDB query filter
-    query = {}
-    if company:
-        query["company"] = {'$regex': company, '$options': 'i'}
-    if tied_to_premise:
-        query["tied_to_premise"] = {'$regex': tied_to_premise, '$options': 'i'}
-    if location:
-        query["location"] = {'$regex': location, '$options': 'i'}
-    if sn:
-        query["S/N"] = int(sn)
-    if model:
-        query["Model"] = {'$regex': model, '$options': 'i'}
-    if color:
-        query["Color"] = {'$regex': color, '$options': 'i'}
-    if current_eo:
-        query["Current EO"] = {'$regex': current_eo, '$options': 'i'}
-    if e1_days:
-        query["E1 - DAYS"] = {'$regex': e1_days, '$options': 'i'}
-    if e1_start:
-        query["E1 - START"] = {'$regex': e1_start, '$options': 'i'}
-    if e1_end:
-        query["E1 - END"] = {'$regex': e1_end, '$options': 'i'}
-    if e1_pause:
-        query["E1 - PAUSE"] = int(e1_pause)
-    if e1_work:
-        query["E1 - WORK"] = int(e1_work)
-    if e2_days:
-        query["E2 - DAYS"] = {'$regex': e2_days, '$options': 'i'}
-    if e2_start:
-        query["E2 - START"] = {'$regex': e2_start, '$options': 'i'}
-    if e2_end:
-        query["E2 - END"] = {'$regex': e2_end, '$options': 'i'}
-    if e2_pause:
-        query["E2 - PAUSE"] = int(e2_pause)
-    if e2_work:
-        query["E2 - WORK"] = int(e2_work)
-    if e3_days:
-        query["E3 - DAYS"] = {'$regex': e3_days, '$options': 'i'}
-    if e3_start:
-        query["E3 - START"] = {'$regex': e3_start, '$options': 'i'}
-    if e3_end:
-        query["E3 - END"] = {'$regex': e3_end, '$options': 'i'}
-    if e3_pause:
-        query["E3 - PAUSE"] = int(e3_pause)
-    if e3_work:
-        query["E3 - WORK"] = int(e3_work)
-    if e4_days:
-        query["E4 - DAYS"] = {'$regex': e4_days, '$options': 'i'}
-    if e4_start:
-        query["E4 - START"] = {'$regex': e4_start, '$options': 'i'}
-    if e4_end:
-        query["E4 - END"] = {'$regex': e4_end, '$options': 'i'}
-    if e4_pause:
-        query["E4 - PAUSE"] = int(e4_pause)
-    if e4_work:
-        query["E4 - WORK"] = int(e4_work)
-
-    # Filter by month and year from created_at
-    if month and year:
-        month_list = [int(m.strip()) for m in month.split(',') if m.strip().isdigit()]
-        query['$expr'] = {
-            '$and': [
-                {'$in': [{'$month': '$created_at'}, month_list]},
-                {'$eq': [{'$year': '$created_at'}, int(year)]}
-            ]
-        }
-
-    # Fetch records from MongoDB
-    records = list(device_list_collection.find(query))
-
-    # Dictionary to store grouped data
-    grouped_data = defaultdict(lambda: {
-        "company": "",
-        "location": "",
-        "sn": "",
-        "model": "",
-        "color": "",
-        "volume": "",
-        "current_eo": "",
-        "e1_days": "",
-        "e1_start": "",
-        "e1_end": "",
-        "e1_pause": "",
-        "e1_work": "",
-        "e2_days": "",
-        "e2_start": "",
-        "e2_end": "",
-        "e2_pause": "",
-        "e2_work": "",
-        "e3_days": "",
-        "e3_start": "",
-        "e3_end": "",
-        "e3_pause": "",
-        "e3_work": "",
-        "e4_days": "",
-        "e4_start": "",
-        "e4_end": "",
-        "e4_pause": "",
-        "e4_work": "",
-        "created_at_month": "",
-        "created_at_year": "",
-        "tied_to_premise": "",
-    })
-
-    for record in records:
-        created_at = record.get("created_at")
-        month_year = created_at.strftime("%B %Y") if isinstance(created_at, datetime) else ""
-
-        # Group by company and sn for display purposes
-        if "S/N" in record:
-            key = (record["company"], record["S/N"])
-            grouped_data[key].update({
-                "company": record["company"],
-                "location": record.get("location", ""),
-                "sn": record.get("S/N", ""),
-                "model": record.get("Model", ""),
-                "color": record.get("Color", ""),
-                "volume": record.get("Volume", ""),
-                "current_eo": record.get("Current EO", ""),
-                "e1_days": record.get("E1 - DAYS", ""),
-                "e1_start": record.get("E1 - START", ""),
-                "e1_end": record.get("E1 - END", ""),
-                "e1_pause": record.get("E1 - PAUSE", ""),
-                "e1_work": record.get("E1 - WORK", ""),
-                "e2_days": record.get("E2 - DAYS", ""),
-                "e2_start": record.get("E2 - START", ""),
-                "e2_end": record.get("E2 - END", ""),
-                "e2_pause": record.get("E2 - PAUSE", ""),
-                "e2_work": record.get("E2 - WORK", ""),
-                "e3_days": record.get("E3 - DAYS", ""),
-                "e3_start": record.get("E3 - START", ""),
-                "e3_end": record.get("E3 - END", ""),
-                "e3_pause": record.get("E3 - PAUSE", ""),
-                "e3_work": record.get("E3 - WORK", ""),
-                "e4_days": record.get("E4 - DAYS", ""),
-                "e4_start": record.get("E4 - START", ""),
-                "e4_end": record.get("E4 - END", ""),
-                "e4_pause": record.get("E4 - PAUSE", ""),
-                "e4_work": record.get("E4 - WORK", ""),
-                "tied_to_premise": record.get("tied_to_premise", ""),
-                "created_at_month": created_at.month if created_at else "",
-                "created_at_year": created_at.year if created_at else "",
-            })
-
-    # Convert dictionary to list for pagination
-    structured_data = list(grouped_data.values())
-
-    # Pagination logic applied after processing data
-    total_records = len(structured_data)
+    # Group by (company, S/N) and page inside Mongo
+    paginated_data, total_records = run_facet(device_list_collection, device_page_pipeline(query, page, limit))
     total_pages = (total_records + limit - 1) // limit
 
-    # Apply slicing for pagination
-    paginated_data = structured_data[(page - 1) * limit: page * limit]
-
     # URL for pagination links
     base_url = request.path
     query_params = request.args.to_dict()
@@ -2071,8 +1731,6 @@ def route_table():
     limit = int(request.args.get('limit', 20))
 
     # Filters
-    company = request.args.get('company', '').strip()
-    premise = request.args.get('premise', '').strip()
     day = request.args.get('day', '').strip()
     month = request.args.get('month', '').strip()
     year = request.args.get('year', '').strip()
@@ -2081,96 +1739,30 @@ def route_table():
 
 
     # MongoDB query filter
-    query = {}
-    if company:
-        query["company"] = {'$regex': company, '$options': 'i'}
-    if premise:
-        query["premise"] = {'$regex': premise, '$options': 'i'}
-    # Mapping weekdays to MongoDB's day-of-week format (Sunday = 1, Monday = 2, ..., Saturday = 7)
-    # day_mapping = {
-    #     "Sunday": 1, "Monday": 2, "Tuesday": 3, "Wednesday": 4,
-    #     "Thursday": 5, "Friday": 6, "Saturday": 7
-    # }
-
-    # if day_of_week in day_mapping:
-    #     query['$expr'] = {'$eq': [{'$dayOfWeek': '$created_at'}, day_mapping[day_of_week]]}
-
-
-    # Filter by date fields
-    if day or month or year:
-        expr_conditions = []
-        
-        if day:
-            day_list = [int(d.strip()) for d in day.split(',') if d.strip().isdigit()]
-            expr_conditions.append({'$in': [{'$dayOfMonth': '$created_at'}, day_list]})
-
-        if month:
-            month_list = [int(m.strip()) for m in month.split(',') if m.strip().isdigit()]
-            expr_conditions.append({'$in': [{'$month': '$created_at'}, month_list]})
+    query = compile_filters(ROUTE_FILTERS, request.args)
+
+    # Filter by date fields that are not covered by a month/year range
+    expr_conditions = []
+    if day:
+        day_list = parse_int_list(day)
+        expr_conditions.append({'$in': [{'$dayOfMonth': '$date'}, day_list]})
+    if not year.isdigit():
+        year = ''  # ignore a non-numeric year so a month filter still applies on its own
+    if year and not month:
+        query['date'] = {'$gte': datetime(int(year), 1, 1), '$lt': datetime(int(year) + 1, 1, 1)}
+    elif month and not year:
+        month_list = parse_int_list(month)
+        expr_conditions.append({'$in': [{'$month': '$date'}, month_list]})
+    if expr_conditions:
+        query['$expr'] = {'$and': expr_conditions}
 
-        if year:
-            expr_conditions.append({'$eq': [{'$year': '$created_at'}, int(year)]})
-
-        query['$expr'] = {'$and': expr_conditions} if expr_conditions else {}
-
-    # Fetch records from MongoDB
     # Sorting order (latest first or oldest first)
     sort_order = -1 if sort_order == "desc" else 1
 
-    # Fetch records from MongoDB and sort by date
-    records = list(route_list_collection.find(query).sort("date", sort_order))
-
-    # Dictionary to store grouped data
-    grouped_data = defaultdict(lambda: {
-        "_id": "",
-        "company": "",
-        "premise_name": "",
-        "premise_area": "",
-        "premise_address": "",
-        "model": "",
-        "color": "",
-        "eo": "",
-        "pics": [],
-        "day": "",
-        "month": "",
-        "year": ""
-    })
-
-    # Process records
-    for record in records:
-        premise_name = record.get("premise", "")
-        company_name = record.get("company", "")
-        route_id = str(record.get("_id", ""))
-        
-        key = (company_name, premise_name)
-        grouped_data[key].update({
-            "_id": route_id,
-            "company": company_name,
-            "premise_name": premise_name,
-            "model": record.get("model", ""),
-            "color": record.get("color", ""),
-            "eo": record.get("eo", ""),
-            "day": record["date"].day if record.get("date") else "",
-            "month": record["date"].month if record.get("date") else "",
-            "year": record["date"].year if record.get("date") else ""
-        })
-
-        # Fetch additional profile details (PICs, Address)
-        profile = profile_list_collection.find_one({"premise_name": premise_name})
-        if profile:
-            grouped_data[key].update({
-                "premise_area": profile.get("premise_area", ""),
-                "premise_address": profile.get("premise_address", ""),
-                "pics": profile.get("pics", [])
-            })
-
-    # Convert dictionary to list for pagination
-    structured_data = list(grouped_data.values())
-
-    # Pagination logic
-    total_records = len(structured_data)
+    # Latest route per premise, paged and joined with the profile in one pipeline
+    pipeline = route_page_pipeline(profile_list_collection.name, query, sort_order, page, limit)
+    paginated_data, total_records = run_facet(route_list_collection, pipeline)
     total_pages = (total_records + limit - 1) // limit
-    paginated_data = structured_data[(page - 1) * limit: page * limit]
 
     # URL for pagination links
     base_url = request.path
@@ -2246,13 +1838,11 @@ def view_help():
 
 @app.route("/image/<file_id>")
 def get_image(file_id):
-    file = fs.get(file_id)
-    return send_file(io.BytesIO(file.read()), mimetype=file.content_type)
+    return send_gridfs_file(fs, file_id, variant=request.args.get('variant'))
 
 @app.route("/signature/<file_id>")
 def get_signature(file_id):
-    file = fs.get(file_id)
-    return send_file(io.BytesIO(file.read()), mimetype=file.content_type)
+    return send_gridfs_file(fs, file_id, default_mimetype='image/png')
 
 @app.route('/get-client-details/<premise_name>')
 def get_client_details(premise_name):
@@ -2264,6 +1854,90 @@ def get_device_details(premise_name):
     devices = list(device_list_collection.find({"tied_to_premise": premise_name}))
     return jsonify(html=render_template("partials/device-details.html", devices=devices))
 
+# Lookups available to /bootstrap; forms fetch everything they need in one request
+bootstrap_lookups = BootstrapLookups()
+
+@bootstrap_lookups.lookup('companies')
+def lookup_companies():
+    return reference_data.get('companies')
+
+@bootstrap_lookups.lookup('essential_oils')
+def lookup_essential_oils():
+    return [eo["eo_name"] for eo in reference_data.get('essential_oils') if "eo_name" in eo]
+
+@bootstrap_lookups.lookup('models')
+def lookup_models():
+    return [model.get("model1") for model in reference_data.get('models') if model.get("model1")]
+
+@bootstrap_lookups.lookup('company_hierarchy')
+def lookup_company_hierarchy(company):
+    return company_hierarchy.get(company)
+
+@bootstrap_lookups.lookup('premises')
+def lookup_premises(company):
+    return [p['name'] for p in company_hierarchy.get(company)['premises']]
+
+@bootstrap_lookups.lookup('devices')
+def lookup_devices(premise, company=None):
+    entry = company_hierarchy.find_premise(premise, company)
+    return entry['devices'] if entry else []
+
+@bootstrap_lookups.lookup('client_details', ttl=30)
+def lookup_client_details(premise):
+    return list(profile_list_collection.find({"tied_to_premise": premise}, {"_id": 0}))
+
+@bootstrap_lookups.lookup('device_details', ttl=30)
+def lookup_device_details(premise):
+    return list(device_list_collection.find({"tied_to_premise": premise}, {"_id": 0}))
+
+CHANGE_NOTE_ACTIONS = [
+    ('change_scent', lambda r: f"change scent to {r.get('change_scent_to') or '?'}"),
+    ('redo_settings', lambda r: "redo settings"),
+    ('reduce_intensity', lambda r: "reduce intensity"),
+    ('increase_intensity', lambda r: "increase intensity"),
+    ('move_device', lambda r: f"move device to {r.get('move_device_to') or '?'}"),
+    ('relocate_device', lambda r: f"relocate device to {r.get('relocate_device_to') or '?'}"),
+    ('collect_back', lambda r: "collect back"),
+]
+
+@bootstrap_lookups.lookup('change_notes', ttl=30)
+def lookup_change_notes(premise):
+    """The premise's latest change requests as one line each, for the service form's overview."""
+    lines = []
+    for record in change_collection.find({'premises': premise}).sort('submitted_at', -1).limit(5):
+        actions = [describe(record) for field, describe in CHANGE_NOTE_ACTIONS if record.get(field)]
+        if record.get('remark'):
+            actions.append(record['remark'])
+        devices = ', '.join(record.get('devices') or [])
+        lines.append(f"{record.get('date') or ''} {devices + ': ' if devices else ''}{'; '.join(actions) or 'no changes'}".strip())
+    return {'notes': '\n'.join(lines)}
+
+@bootstrap_lookups.lookup('eos')
+def lookup_eos(devices, company=None):
+    if isinstance(devices, str):
+        devices = [d for d in devices.split(',') if d]
+    return company_hierarchy.device_eos(devices, company)
+
+@app.route('/bootstrap', methods=['GET', 'POST'])
+def bootstrap():
+    """Run several named lookups concurrently and return them in one JSON object.
+
+    POST {"lookups": [{"name": "companies"}, {"name": "premises", "params": {"company": "X"}}]}
+    GET  /bootstrap?lookups=companies,essential_oils,premises&company=X
+    """
+    if "username" not in session:
+        return jsonify({"error": "Unauthorized"}), 403
+    if request.method == 'POST':
+        lookups = (request.get_json(silent=True) or {}).get('lookups')
+    else:
+        lookups = bootstrap_lookups.requests_from_args(request.args.get('lookups', ''), request.args)
+    if not isinstance(lookups, list) or not all(isinstance(l, dict) for l in lookups):
+        return jsonify({"error": "lookups must be a list", "available": bootstrap_lookups.names()}), 400
+    try:
+        return jsonify(bootstrap_lookups.run(lookups))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route('/service', methods=['GET', 'POST'])
 def service():
     if 'username' not in session:
@@ -2271,14 +1945,14 @@ def service():
 
     technician_name = session["username"]
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    companies = services_collection.distinct('company')
+    companies = reference_data.get('companies')
 
     if request.method == 'POST':
         premise_name = request.form.get("premiseName")
         actions_taken = request.form.getlist("actions")
         remarks = request.form.get("remarks")
         staff_name = request.form.get("staffName")
-        signature = request.form.get("signature")
+        signature_id = store_signature(fs, db['fs.files'], request.form.get("signature"))
 
         # Fetch selected premise details
         premise_details = profile_list_collection.find_one({"premise_name": premise_name})
@@ -2333,10 +2007,11 @@ def service():
             "actions_taken": actions_taken,
             "remarks": remarks,
             "staff_name": staff_name,
-            "signature": signature,
+            "signature_id": signature_id,
         }
 
         change_collection.insert_one(field_service_record)
+        invalidate_dashboard_metrics()
 
         flash("Field service report submitted successfully!", "success")
         return redirect(url_for("field_service", companies=companies))
@@ -2348,6 +2023,9 @@ def service():
 
 @app.after_request
 def add_no_cache_headers(response):
+    # Pages must not be cached; GridFS media sets its own long-lived headers (see media.py)
+    if response.headers.get("Cache-Control") in (MEDIA_CACHE_CONTROL, MEDIA_PENDING_CACHE_CONTROL):
+        return response
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
@@ -2363,13 +2041,8 @@ def add_no_cache_headers(response):
     
 @app.route("/device-image/<image_id>")
 def get_device_image(image_id):
-    """Retrieve and return device image stored in GridFS."""
-    try:
-        image = fs.get(ObjectId(image_id))
-        return Response(image.read(), mimetype=image.content_type)  # Ensure proper content type
-    except Exception as e:
-        print(f"Error fetching image: {str(e)}")
-        return "Image not found", 404
+    """Retrieve and return device image stored in GridFS (?variant=thumb|display for a resized copy)."""
+    return send_gridfs_file(fs, image_id, variant=request.args.get('variant'))
 
 
 
@@ -2392,6 +2065,7 @@ def save_all():
     for eo in added:
         existing = eo_pack_collection.find_one({'eo_name': eo['eo_name']})
         if existing:
+            reference_data.invalidate('essential_oils')  # earlier steps may have written
             return jsonify({'status': 'error', 'message': f"EO name '{eo['eo_name']}' already exists."}), 400
         eo_pack_collection.insert_one({"eo_name": eo['eo_name']})  # No order yet
 
@@ -2402,6 +2076,7 @@ def save_all():
             '_id': {'$ne': ObjectId(eo['_id'])}
         })
         if existing:
+            reference_data.invalidate('essential_oils')  # earlier steps may have written
             return jsonify({'status': 'error', 'message': f"EO name '{eo['eo_name']}' already exists."}), 400
         eo_pack_collection.update_one({'_id': ObjectId(eo['_id'])}, {'$set': {'eo_name': eo['eo_name']}})
 
@@ -2420,6 +2095,8 @@ def save_all():
                 eo_pack_collection.update_one({'_id': eo['_id']}, {'$set': {'order': index}})
         index += 1
 
+    invalidate_counts(eo_pack_collection)
+    reference_data.invalidate('essential_oils')
     return jsonify({'status': 'success'})
 
 
@@ -2446,6 +2123,7 @@ def save_model1_changes():
     for model in added:
         existing = model_list_collection.find_one({'model1': model['model1']})
         if existing:
+            reference_data.invalidate('models')  # earlier steps may have written
             return jsonify({'status': 'error', 'message': f"Model1 '{model['model1']}' already exists."}), 400
         last = model_list_collection.find_one(sort=[("order", -1)])
         last_order = last['order'] + 1 if last else 0
@@ -2457,6 +2135,7 @@ def save_model1_changes():
             '_id': {'$ne': ObjectId(model['_id'])}
         })
         if existing:
+            reference_data.invalidate('models')  # earlier steps may have written
             return jsonify({'status': 'error', 'message': f"Model1 '{model['model1']}' already exists."}), 400
         model_list_collection.update_one({'_id': ObjectId(model['_id'])}, {'$set': {'model1': model['model1']}})
 
@@ -2466,27 +2145,25 @@ def save_model1_changes():
     for idx, _id in enumerate(order):
         model_list_collection.update_one({'_id': ObjectId(_id)}, {'$set': {'order': idx}})
 
+    invalidate_counts(model_list_collection)
+    reference_data.invalidate('models')
     return jsonify({'status': 'success'})
 
 @app.route('/get-premises/<company>')
 def get_premises(company):
-    premises = services_collection.distinct('Premise Name', {'company': company})
+    premises = [p['name'] for p in company_hierarchy.get(company)['premises']]
     return render_template('partials/premise_checkboxes.html', premises=premises)
 
 @app.route('/get-devices/<premise>')
 def get_devices(premise):
-    devices = device_list_collection.find({'tied_to_premise': premise})
+    entry = company_hierarchy.find_premise(premise, request.args.get('company'))
     return jsonify({
-        'devices': [d['location'] for d in devices]
+        'devices': [d['location'] for d in (entry['devices'] if entry else []) if d.get('location')]
     })
 @app.route('/get-eos', methods=['POST'])
 def get_eos():
-    devices = request.json.get('devices', [])
-    eos = set()
-    for d in device_list_collection.find({'location': {'$in': devices}}):
-        if 'Current EO' in d:
-            eos.add(d['Current EO'])
-    return jsonify({'eos': list(eos)})
+    data = request.get_json(silent=True) or {}
+    return jsonify({'eos': company_hierarchy.device_eos(data.get('devices') or [], data.get('company'))})
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,121 @@
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+BOOTSTRAP_WORKERS = 8
+BOOTSTRAP_TIMEOUT = 10     # seconds to wait for a whole batch
+MAX_LOOKUPS = 20           # lookups accepted in one request
+MAX_CACHED_LOOKUPS = 1000
+
+
+class BootstrapLookups:
+    """Named data lookups that a form can request together in one round trip.
+
+    Lookups are registered with @lookups.lookup(name, ttl=...) and take their
+    parameters as keyword arguments. run() executes a batch concurrently on a
+    per-process thread pool (pymongo releases the GIL while waiting on the
+    server), so a batch costs roughly its slowest lookup. Results of lookups
+    with a ttl are cached per (name, params) in this process; lookups backed
+    by an existing cache (reference data, company trees) use ttl=0.
+    """
+
+    def __init__(self, workers=BOOTSTRAP_WORKERS):
+        self.workers = workers
+        self._lookups = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def lookup(self, name, ttl=0):
+        def register(func):
+            signature = inspect.signature(func)
+            self._lookups[name] = {'func': func, 'ttl': ttl, 'signature': signature,
+                                   'params': set(signature.parameters)}
+            return func
+        return register
+
+    def names(self):
+        return sorted(self._lookups)
+
+    @staticmethod
+    def _accepts(spec, params):
+        # Checked against the signature up front, so a TypeError raised inside a lookup is a real failure
+        try:
+            spec['signature'].bind(**params)
+        except TypeError:
+            return False
+        return True
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='bootstrap')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _call(self, name, params):
+        spec = self._lookups[name]
+        key = (name, json.dumps(params, sort_keys=True, default=str))
+        now = time.monotonic()
+        if spec['ttl']:
+            with self._lock:
+                hit = self._cache.get(key)
+            if hit and now - hit[0] < spec['ttl']:
+                return hit[1]
+        value = spec['func'](**params)
+        if spec['ttl']:
+            with self._lock:
+                if len(self._cache) >= MAX_CACHED_LOOKUPS:
+                    self._cache.clear()
+                self._cache[key] = (now, value)
+        return value
+
+    def run(self, requests, timeout=BOOTSTRAP_TIMEOUT):
+        """Run [{'name', 'params', 'key'}, ...] and return {key: result}.
+
+        `key` defaults to the lookup name (give one to request the same lookup
+        twice). Parameters are checked against the lookup's signature before
+        it runs. A lookup that fails, is unknown or gets missing or unexpected
+        parameters returns {'error': message} under its key without failing
+        the batch; failures inside a lookup are logged.
+        """
+        if len(requests) > MAX_LOOKUPS:
+            raise ValueError(f"At most {MAX_LOOKUPS} lookups per request")
+        results, futures = {}, {}
+        executor = self._get_executor()
+        for request in requests:
+            name = request.get('name')
+            key = request.get('key') or name
+            params = request.get('params') or {}
+            spec = self._lookups.get(name)
+            if spec is None:
+                results[key] = {'error': f"Unknown lookup '{name}'"}
+            elif not isinstance(params, dict) or not self._accepts(spec, params):
+                results[key] = {'error': f"Invalid parameters for '{name}', expected: {', '.join(sorted(spec['params']))}"}
+            else:
+                futures[key] = executor.submit(self._call, name, params)
+
+        done, _ = wait(futures.values(), timeout=timeout)
+        for key, future in futures.items():
+            if future not in done:
+                future.cancel()
+                results[key] = {'error': 'Timed out'}
+                continue
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                print(f"Bootstrap lookup {key} failed: {e}")
+                results[key] = {'error': 'Lookup failed'}
+        return results
+
+    def requests_from_args(self, names, args):
+        """Build run() requests from ?lookups=a,b&param=... (each lookup gets the params it accepts)."""
+        requests = []
+        for name in [n.strip() for n in names.split(',') if n.strip()]:
+            accepted = self._lookups[name]['params'] if name in self._lookups else set()
+            requests.append({'name': name, 'params': {k: v for k, v in args.items() if k in accepted}})
+        return requests
@@ -7,6 +7,7 @@ MONGO_URI = os.getenv('MONGO_URL')
 mongo = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
 db = mongo['customer']
 collection = db['case_issue']
+counters_collection = db['counters']
 
 login_db=mongo['login_admin']
 login_collection=login_db['log']
@@ -28,6 +29,7 @@ straw_list_collection = dashboard_db['straw_mist_heads_pack']
 profile_list_collection = dashboard_db['profile']
 device_list_collection = dashboard_db['device']
 route_list_collection = dashboard_db['routes']
+hierarchy_collection = dashboard_db['company_hierarchy']
 
 # customer_collection = dashboard_db['customer']
 # device_collection = dashboard_db['device']
@@ -37,5 +39,13 @@ refund_collection = dashboard_db['refund']
 logs_db=mongo['logs']
 logs_collection=logs_db['logs']
 
+mail_db=mongo['mail']
+mail_outbox_collection=mail_db['outbox']
+
+jobs_db=mongo['jobs']
+job_locks_collection=jobs_db['locks']
+job_runs_collection=jobs_db['runs']
+job_checkpoints_collection=jobs_db['checkpoints']
+
 test_db=mongo['test']
 test_collection=test_db['test']
\ No newline at end of file
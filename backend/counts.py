@@ -0,0 +1,55 @@
+import threading
+import time
+from bson import json_util
+
+COUNT_TTL = 30           # seconds a filtered count is reused between writes
+APPROX_COUNT_TTL = 300   # seconds a count is reused when "page N of ~M" is good enough
+MAX_CACHED_COUNTS = 1000
+
+# (namespace, normalized query, collation) -> (cached_at, total)
+# Process-local: each gunicorn worker has its own copy, so writes handled by
+# another worker only show up once the TTL runs out.
+_counts = {}
+_lock = threading.Lock()
+
+
+def _cache_key(collection, query, collation):
+    normalized = json_util.dumps(query, sort_keys=True)
+    return collection.full_name, normalized, str(collation.document if collation else None)
+
+
+def count_entries(collection, query, collation=None, approximate=False):
+    """Total number of documents matching `query`, for computing total_pages.
+
+    Unfiltered views use estimated_document_count() (collection metadata, no
+    scan). Filtered counts are cached per normalized query for COUNT_TTL, or
+    APPROX_COUNT_TTL when the caller only needs an approximate total.
+    """
+    if not query:
+        return collection.estimated_document_count()
+
+    key = _cache_key(collection, query, collation)
+    ttl = APPROX_COUNT_TTL if approximate else COUNT_TTL
+    now = time.monotonic()
+    with _lock:
+        hit = _counts.get(key)
+    if hit and now - hit[0] < ttl:
+        return hit[1]
+
+    total = collection.count_documents(query, collation=collation)
+    with _lock:
+        if len(_counts) >= MAX_CACHED_COUNTS:
+            for stale in [k for k, (at, _) in _counts.items() if now - at >= APPROX_COUNT_TTL]:
+                del _counts[stale]
+            if len(_counts) >= MAX_CACHED_COUNTS:
+                _counts.clear()
+        _counts[key] = (now, total)
+    return total
+
+
+def invalidate_counts(*collections):
+    """Forget cached counts for the given collections. Call after writing to them."""
+    names = {c.full_name for c in collections}
+    with _lock:
+        for key in [k for k in _counts if k[0] in names]:
+            del _counts[key]
@@ -0,0 +1,130 @@
+"""Local stand-in SMTP server that accepts every message and keeps it in memory.
+
+Run it for development and point Flask-Mail at it:
+
+    python dev_smtp.py --port 1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false python app.py
+
+or use it from a test:
+
+    with DevSMTPServer() as server:
+        ...  # send mail to ('localhost', server.port)
+        assert server.messages[0]["rcpt_to"] == ["someone@example.com"]
+"""
+import argparse
+import socketserver
+import threading
+from email import message_from_bytes
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 dev-smtp ready")
+        mail_from, rcpt_to = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            command = line[:4].upper()
+
+            if command in ("HELO", "EHLO"):
+                if command == "EHLO":
+                    self.wfile.write(b"250-dev-smtp\r\n250-AUTH PLAIN LOGIN\r\n")
+                self.reply("250 OK")
+            elif line.upper().startswith("AUTH LOGIN"):
+                # Username and password prompts; any credentials are accepted
+                self.reply("334 VXNlcm5hbWU6")
+                self.rfile.readline()
+                self.reply("334 UGFzc3dvcmQ6")
+                self.rfile.readline()
+                self.reply("235 Authentication successful")
+            elif command == "AUTH":
+                self.reply("235 Authentication successful")
+            elif line.upper().startswith("MAIL FROM:"):
+                mail_from, rcpt_to = line[10:].strip().strip("<>"), []
+                self.reply("250 OK")
+            elif line.upper().startswith("RCPT TO:"):
+                rcpt_to.append(line[8:].strip().strip("<>"))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                data = b"".join(lines)
+                self.server.store(mail_from, rcpt_to, data)
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK: queued")
+            elif command == "RSET":
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class DevSMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP sink on localhost. Port 0 picks a free port (see .port)."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="localhost", port=0, verbose=False):
+        super().__init__((host, port), _SMTPHandler)
+        self.verbose = verbose
+        self.messages = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def store(self, mail_from, rcpt_to, data):
+        message = {"mail_from": mail_from, "rcpt_to": list(rcpt_to), "data": data,
+                   "message": message_from_bytes(data)}
+        with self._lock:
+            self.messages.append(message)
+        if self.verbose:
+            print(f"--- {mail_from} -> {', '.join(rcpt_to)}")
+            print(data.decode(errors="replace"))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink for development")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    server = DevSMTPServer(args.host, args.port, verbose=True)
+    print(f"Dev SMTP server listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
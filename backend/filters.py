@@ -0,0 +1,179 @@
+import re
+from datetime import datetime
+from pymongo.collation import Collation
+
+# Case-insensitive comparison for "exact" and "prefix" string filters. Indexes
+# that should serve these filters must be declared with the same collation.
+CASE_INSENSITIVE = Collation(locale='en', strength=2)
+
+# ICU sorts U+FFFF after every other character, so [value, value + PREFIX_END)
+# spans every string starting with value under any collation
+PREFIX_END = '\uffff'
+
+
+# Filter spec for the master list (/all-list): (request arg, document field, match type)
+# Later entries win when two args target the same field (EO / Current_EO, Model).
+MASTER_LIST_FILTERS = [
+    (('month', 'year'), 'month_year', 'month_year'),
+    ('industry', 'industry', 'prefix'),
+    ('premise', 'premise_name', 'prefix'),
+    ('pic', 'name', 'prefix'),
+    ('EO', 'Current EO', 'prefix'),
+    ('Company', 'company', 'prefix'),
+    ('Volume', 'Volume', 'number'),
+    ('SN', 'S/N', 'number'),
+    ('Balance', 'Balance', 'number'),
+    ('Consumption', 'Consumption', 'number'),
+    ('Refilled', 'Refilled', 'number'),
+    ('E1_Work', 'E1 - WORK', 'number'),
+    ('E1_Pause', 'E1 - PAUSE', 'number'),
+    ('E1_Days', 'E1 - DAYS', 'prefix'),
+    ('E1_Start', 'E1 - START', 'prefix'),
+    ('E1_End', 'E1 - END', 'prefix'),
+    ('E2_Work', 'E2 - WORK', 'number'),
+    ('E2_Pause', 'E2 - PAUSE', 'number'),
+    ('E2_Days', 'E2 - DAYS', 'prefix'),
+    ('E2_Start', 'E2 - START', 'prefix'),
+    ('E2_End', 'E2 - END', 'prefix'),
+    ('E3_Work', 'E3 - WORK', 'number'),
+    ('E3_Pause', 'E3 - PAUSE', 'number'),
+    ('E3_Days', 'E3 - DAYS', 'prefix'),
+    ('E3_Start', 'E3 - START', 'prefix'),
+    ('E3_End', 'E3 - END', 'prefix'),
+    ('E4_Work', 'E4 - WORK', 'number'),
+    ('E4_Pause', 'E4 - PAUSE', 'number'),
+    ('E4_Days', 'E4 - DAYS', 'prefix'),
+    ('E4_Start', 'E4 - START', 'prefix'),
+    ('E4_End', 'E4 - END', 'prefix'),
+    ('Model', 'Model', 'prefix'),
+    ('Colour', 'Color', 'exact'),
+    ('Current_EO', 'Current EO', 'prefix'),
+    ('New_EO', 'New EO', 'prefix'),
+    ('Scent_Effectiveness', '#1 Scent Effectiveness', 'prefix'),
+    ('Common_Encounters', '#1 Common encounters', 'prefix'),
+    ('Other_Remarks', '#1 Other remarks', 'prefix'),
+]
+
+
+# Filter spec for premise records on /profile. The 'pic' arg is handled by the
+# profile pipeline since it matches the joined PIC records, not the premise.
+PROFILE_FILTERS = [
+    (('month', 'year'), 'created_at', 'month_year'),
+    ('company', 'company', 'prefix'),
+    ('industry', 'industry', 'prefix'),
+    ('premise', 'premise_name', 'prefix'),
+]
+
+
+# Filter spec for /view-device over the device collection.
+DEVICE_FILTERS = [
+    (('month', 'year'), 'created_at', 'month_year'),
+    ('company', 'company', 'prefix'),
+    ('tied_to_premise', 'tied_to_premise', 'prefix'),
+    ('location', 'location', 'prefix'),
+    ('sn', 'S/N', 'number'),
+    ('model', 'Model', 'prefix'),
+    ('color', 'Color', 'prefix'),
+    ('current_eo', 'Current EO', 'prefix'),
+] + [
+    (f'e{n}_{arg}', f'E{n} - {field}', match)
+    for n in range(1, 5)
+    for arg, field, match in [
+        ('days', 'DAYS', 'prefix'),
+        ('start', 'START', 'prefix'),
+        ('end', 'END', 'prefix'),
+        ('pause', 'PAUSE', 'number'),
+        ('work', 'WORK', 'number'),
+    ]
+]
+
+
+# Filter spec for /route_table. Day-of-month and month-without-year filters
+# cannot be expressed as date ranges and are added by the route as $expr.
+ROUTE_FILTERS = [
+    (('month', 'year'), 'date', 'month_year'),
+    ('company', 'company', 'prefix'),
+    ('premise', 'premise', 'prefix'),
+]
+
+
+def parse_int_list(value):
+    """Turn '1, 2,x,3' into [1, 2, 3]."""
+    return [int(v.strip()) for v in value.split(',') if v.strip().isdigit()]
+
+
+def month_year_ranges(field, months, year):
+    """Build date-range conditions on `field` covering the given months of `year`.
+
+    Consecutive months are merged so "1,2,3" becomes a single range.
+    """
+    ranges = []
+    for month in sorted(set(m for m in months if 1 <= m <= 12)):
+        start = datetime(year, month, 1)
+        end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return [{field: {'$gte': start, '$lt': end}} for start, end in ranges]
+
+
+def _number_condition(value):
+    """'10' -> 10, '10-20' -> {'$gte': 10, '$lte': 20}. Returns None if not numeric."""
+    low, sep, high = value.partition('-')
+    try:
+        if sep and low.strip():
+            return {'$gte': int(low), '$lte': int(high)}
+        return int(value)
+    except ValueError:
+        return None
+
+
+def compile_filters(spec, args, collation=None):
+    """Compile request args into a Mongo query using a filter spec.
+
+    Match types:
+      exact      - equality, case-insensitive when run with CASE_INSENSITIVE
+      prefix     - starts-with match. With a collation (pass the one the query
+                   runs with) it is a range query, which honours the collation
+                   and is bounded by an index built with it; otherwise an
+                   anchored case-insensitive regex, which cannot use an index
+      number     - integer equality, or an inclusive 'low-high' range
+      enum       - comma separated values matched with $in
+      month_year - ('month', 'year') args compiled into date ranges
+    Blank or unparsable values are ignored instead of raising.
+    """
+    query = {}
+    for arg, field, match in spec:
+        if match == 'month_year':
+            month = args.get(arg[0], '').strip()
+            year = args.get(arg[1], '').strip()
+            if not (month and year.isdigit()):
+                continue
+            ranges = month_year_ranges(field, parse_int_list(month), int(year))
+            if len(ranges) == 1:
+                query.update(ranges[0])
+            elif ranges:
+                query['$or'] = ranges
+            continue
+
+        value = (args.get(arg) or '').strip()
+        if not value:
+            continue
+
+        if match == 'exact':
+            query[field] = value
+        elif match == 'prefix':
+            if collation is not None:
+                query[field] = {'$gte': value, '$lt': value + PREFIX_END}
+            else:
+                query[field] = {'$regex': '^' + re.escape(value), '$options': 'i'}
+        elif match == 'number':
+            condition = _number_condition(value)
+            if condition is not None:
+                query[field] = condition
+        elif match == 'enum':
+            query[field] = {'$in': [v.strip() for v in value.split(',') if v.strip()]}
+        else:
+            raise ValueError(f"Unknown match type '{match}' for {field}")
+    return query
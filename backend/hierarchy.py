@@ -0,0 +1,171 @@
+import math
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+
+# services documents carry the premise as 'Premise Name' (spreadsheet import) or 'premise_name' (new-customer form)
+PREMISE_FIELD = {'$ifNull': ['$Premise Name', '$premise_name']}
+
+
+def _clean(values):
+    """Sorted distinct values without blanks or the NaNs left by spreadsheet imports."""
+    return sorted({value for value in values
+                   if value not in (None, '') and not (isinstance(value, float) and math.isnan(value))}, key=str)
+
+
+def company_services_pipeline(company):
+    """premise -> model -> color -> EOs for one company, grouped inside Mongo."""
+    return [
+        {'$match': {'company': company}},
+        {'$group': {
+            '_id': {'premise': PREMISE_FIELD, 'model': '$Model', 'color': '$Color'},
+            'eos': {'$addToSet': '$Current EO'},
+        }},
+        {'$group': {
+            '_id': {'premise': '$_id.premise', 'model': '$_id.model'},
+            'colors': {'$push': {'name': '$_id.color', 'eos': '$eos'}},
+        }},
+        {'$group': {
+            '_id': '$_id.premise',
+            'models': {'$push': {'name': '$_id.model', 'colors': '$colors'}},
+        }},
+    ]
+
+
+def build_company_tree(services, devices, company):
+    """The company's premises with their model/color/EO cascade and devices, as stored and served."""
+    premises = {}
+    for row in services.aggregate(company_services_pipeline(company)):
+        if not _clean([row['_id']]):
+            continue
+        models = []
+        for model in row['models']:
+            if not _clean([model['name']]):
+                continue
+            colors = [{'name': color['name'], 'eos': _clean(color['eos'])}
+                      for color in model['colors'] if _clean([color['name']])]
+            models.append({'name': model['name'], 'colors': sorted(colors, key=lambda c: str(c['name']))})
+        premises[row['_id']] = {'name': row['_id'], 'models': sorted(models, key=lambda m: str(m['name'])),
+                                'devices': []}
+
+    projection = {'_id': 0, 'tied_to_premise': 1, 'location': 1, 'S/N': 1, 'Model': 1, 'Color': 1, 'Current EO': 1}
+    for device in devices.find({'company': company}, projection):
+        premise = device.get('tied_to_premise')
+        if not _clean([premise]):
+            continue
+        entry = premises.setdefault(premise, {'name': premise, 'models': [], 'devices': []})
+        entry['devices'].append({
+            'location': device.get('location'),
+            'sn': device.get('S/N'),
+            'model': device.get('Model'),
+            'color': device.get('Color'),
+            'eo': (_clean([device.get('Current EO')]) or [None])[0],
+        })
+
+    return [premises[name] for name in sorted(premises, key=str)]
+
+
+def merge_premises(entries):
+    """One premise subtree from several: models, colors and EOs are unioned, devices concatenated."""
+    models = {}
+    for entry in entries:
+        for model in entry['models']:
+            colors = models.setdefault(model['name'], {})
+            for color in model['colors']:
+                colors.setdefault(color['name'], set()).update(color['eos'])
+    return {
+        'name': entries[0]['name'],
+        'models': [{'name': model,
+                    'colors': [{'name': color, 'eos': _clean(eos)}
+                               for color, eos in sorted(colors.items(), key=lambda c: str(c[0]))]}
+                   for model, colors in sorted(models.items(), key=lambda m: str(m[0]))],
+        'devices': [device for entry in entries for device in entry['devices']],
+    }
+
+
+class CompanyHierarchy:
+    """Materialized company -> premise -> model -> color -> EO (+ devices) trees, one document per company.
+
+    Writes to services or devices only mark the affected companies stale
+    (a $inc on a version field); the next read of a stale or missing company
+    rebuilds just that company with one aggregation and one device query. A
+    rebuild is only saved if the version is unchanged, so a write landing
+    during a rebuild is never masked by an older tree.
+    """
+
+    def __init__(self, target, services, devices):
+        self.target = target
+        self.services = services
+        self.devices = devices
+
+    def rebuild(self, company):
+        current = self.target.find_one({'_id': company}, {'version': 1})
+        version = current.get('version', 0) if current else 0
+        tree = {
+            'company': company,
+            'premises': build_company_tree(self.services, self.devices, company),
+            'built_at': datetime.now(),
+            'stale': False,
+            'version': version,
+        }
+        if current is None:
+            try:
+                self.target.insert_one({'_id': company, **tree})
+            except DuplicateKeyError:
+                pass  # another worker built it first
+        else:
+            self.target.replace_one({'_id': company, 'version': version}, tree)
+        return tree
+
+    def get(self, company):
+        doc = self.target.find_one({'_id': company})
+        if doc is None or doc.get('stale'):
+            doc = self.rebuild(company)
+        return {'company': company, 'premises': doc['premises'], 'built_at': doc['built_at']}
+
+    def mark_stale(self, *companies):
+        companies = [company for company in companies if company]
+        if companies:
+            self.target.update_many({'_id': {'$in': companies}},
+                                    {'$set': {'stale': True}, '$inc': {'version': 1}})
+
+    def find_premise(self, premise, company=None):
+        """The subtree of a premise name, or None.
+
+        Premise names are not unique across companies, so without `company`
+        the subtrees of every company with that premise (found through the
+        premises.name index) are merged into one.
+        """
+        if company:
+            companies = [company]
+        else:
+            companies = [doc['_id'] for doc in self.target.find({'premises.name': premise}, {'_id': 1})]
+            if not companies:
+                # Not built yet (or not in any tree); find the companies through services
+                companies = _clean(self.services.distinct(
+                    'company', {'$or': [{'Premise Name': premise}, {'premise_name': premise}]}))
+        entries = [entry for company in companies for entry in self.get(company)['premises']
+                   if entry['name'] == premise]
+        return merge_premises(entries) if entries else None
+
+    def device_eos(self, locations, company=None):
+        """Sorted EOs of the devices at the given locations, optionally within one company."""
+        locations = set(locations)
+        if company:
+            companies = [company]
+        else:
+            companies = [doc['_id'] for doc in
+                         self.target.find({'premises.devices.location': {'$in': list(locations)}}, {'_id': 1})]
+        eos = set()
+        for company in companies:
+            for entry in self.get(company)['premises']:
+                eos.update(device['eo'] for device in entry['devices']
+                           if device['location'] in locations and device['eo'])
+        return _clean(eos)
+
+    def rebuild_all(self):
+        """Rebuild every company's tree (manual job). Returns counts."""
+        companies = _clean(self.services.distinct('company'))
+        for company in companies:
+            self.rebuild(company)
+        removed = self.target.delete_many({'_id': {'$nin': companies}}).deleted_count
+        return {'companies': len(companies), 'removed': removed}
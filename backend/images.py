@@ -0,0 +1,126 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it originals are served as uploaded
+    Image = ImageOps = None
+
+# Longest side in pixels of each stored variant
+IMAGE_VARIANTS = {'display': 1600, 'thumb': 320}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANT_WORKERS = 2
+
+
+def build_variants(data, variants=IMAGE_VARIANTS, quality=IMAGE_VARIANT_QUALITY):
+    """Resize image bytes into each variant. Returns {name: (bytes, content_type, (width, height))}.
+
+    JPEGs are decoded at reduced scale (draft mode) and each variant is
+    shrunk from the previous, larger one. Images with transparency stay PNG,
+    everything else becomes a progressive JPEG.
+    """
+    results = {}
+    with Image.open(io.BytesIO(data)) as img:
+        largest = max(variants.values())
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        keep_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if keep_alpha else 'RGB')
+        for name, max_side in sorted(variants.items(), key=lambda item: -item[1]):
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            out = io.BytesIO()
+            if keep_alpha:
+                img.save(out, 'PNG', optimize=True)
+                content_type = 'image/png'
+            else:
+                img.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+                content_type = 'image/jpeg'
+            results[name] = (out.getvalue(), content_type, img.size)
+    return results
+
+
+class ImageVariants:
+    """Generates display and thumbnail variants of uploaded images in GridFS.
+
+    Variants are separate GridFS files (metadata.variant_of points at the
+    original) and the original's metadata.variants maps variant name -> id,
+    which send_gridfs_file uses to serve the smallest adequate copy. Work runs
+    on a small thread pool so uploads return immediately; until it finishes,
+    or if Pillow is not installed, the original is served. A variant that is
+    not smaller than the original is not stored.
+    """
+
+    def __init__(self, fs, files, variants=IMAGE_VARIANTS, workers=IMAGE_VARIANT_WORKERS):
+        self.fs = fs
+        self.files = files
+        self.variants = variants
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # One pool per process; gunicorn workers each get their own after fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='image-variants')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, file_id):
+        """Queue variant generation for an uploaded file."""
+        if Image is None or file_id is None:
+            return None
+        return self._get_executor().submit(self._process_logged, file_id)
+
+    def _process_logged(self, file_id):
+        try:
+            return self.process(file_id)
+        except Exception as e:
+            print(f"Failed to build image variants for {file_id}: {e}")
+
+    def process(self, file_id):
+        """Build and store the variants of one file. Returns {variant: file_id}."""
+        file_id = ObjectId(file_id)
+        original = self.fs.get(file_id)
+        data = original.read()
+        stored = {}
+        try:
+            variants = build_variants(data, self.variants)
+        except Exception as e:
+            # Not an image Pillow can read; record that so backfills skip it
+            print(f"Skipping image variants for {file_id}: {e}")
+            variants = {}
+        for name, (variant_data, content_type, (width, height)) in variants.items():
+            if len(variant_data) >= len(data):
+                continue
+            stored[name] = self.fs.put(
+                variant_data,
+                filename=f"{name}_{original.filename or file_id}",
+                content_type=content_type,
+                metadata={'variant_of': file_id, 'variant': name, 'width': width, 'height': height,
+                          'content_type': content_type},
+            )
+        self.files.update_one({'_id': file_id}, {'$set': {'metadata.variants': stored}})
+        return stored
+
+    def backfill(self, limit=None):
+        """Build variants for stored originals that have none yet. Returns counts."""
+        if Image is None:
+            return {'processed': 0, 'error': 'Pillow is not installed'}
+        query = {'metadata.variant_of': {'$exists': False}, 'metadata.variants': {'$exists': False}}
+        cursor = self.files.find(query, {'_id': 1}).sort('_id', 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        summary = {'processed': 0, 'variants': 0, 'errors': 0}
+        for doc in cursor:
+            try:
+                summary['variants'] += len(self.process(doc['_id']))
+                summary['processed'] += 1
+            except Exception as e:
+                summary['errors'] += 1
+                print(f"Failed to build image variants for {doc['_id']}: {e}")
+        return summary
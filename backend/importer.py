@@ -0,0 +1,174 @@
+from datetime import datetime, date, time
+from pymongo import UpdateOne
+from spreadsheets import normalize_header
+
+IMPORT_BATCH_SIZE = 5000
+MAX_ROW_ERRORS = 1000   # row errors kept for the report; the total is always counted
+
+# Master-list (services) fields as the legacy service list spreadsheets and reports() name them
+MASTER_FIELDS = [
+    'company', 'industry', 'Premise Name', 'premise_area', 'premise_address',
+    'name', 'designation', 'contact', 'email',
+    'Model', 'Color', 'S/N', 'Volume', 'Current EO', 'Balance', 'Consumption', 'New EO', 'Refilled',
+    *[f"E{n} - {field}" for n in range(1, 5) for field in ('DAYS', 'START', 'END', 'WORK', 'PAUSE')],
+    '#1 Scent Effectiveness', '#1 Common encounters', '#1 Other remarks',
+]
+NUMERIC_FIELDS = {'S/N', 'Volume', 'Balance', 'Consumption', 'Refilled'} | {
+    f"E{n} - {field}" for n in range(1, 5) for field in ('WORK', 'PAUSE')}
+
+# Normalized spreadsheet header -> master field. Every master field also matches its own name.
+MASTER_COLUMNS = {
+    **{normalize_header(field): field for field in MASTER_FIELDS},
+    'company name': 'company',
+    'premise': 'Premise Name',
+    'premise_name': 'Premise Name',
+    'premise area': 'premise_area',
+    'premise address': 'premise_address',
+    'pic': 'name',
+    'pic name': 'name',
+    'colour': 'Color',
+    'sn': 'S/N',
+    'serial number': 'S/N',
+    'eo': 'Current EO',
+    'scent effectiveness': '#1 Scent Effectiveness',
+    'common encounters': '#1 Common encounters',
+    'other remarks': '#1 Other remarks',
+}
+MONTH_YEAR_COLUMNS = ('month_year', 'date')
+
+
+class RowError(ValueError):
+    """A spreadsheet row that cannot be imported; the message is reported against its row number."""
+
+
+def _cell(value):
+    # Spreadsheet times and datetimes are stored as text, as the old file-import script did
+    if isinstance(value, (datetime, time)):
+        return value.strftime('%H:%M:%S')
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+
+def _number(field, value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            raise RowError(f"{field} '{value}' is not a number")
+
+
+def parse_month(value):
+    """First day of the month for a date/datetime, 'YYYY-MM' or 'YYYY-MM-DD'; None if blank."""
+    if value in (None, ''):
+        return None
+    if isinstance(value, (datetime, date)):
+        return datetime(value.year, value.month, 1)
+    try:
+        parsed = datetime.strptime(str(value).strip()[:7], '%Y-%m')
+    except ValueError:
+        raise RowError(f"month '{value}' is not a YYYY-MM date")
+    return parsed
+
+
+def _row_month(row):
+    for column in MONTH_YEAR_COLUMNS:
+        if row.get(column) not in (None, ''):
+            return parse_month(row[column])
+    month, year = row.get('month'), row.get('year')
+    if month in (None, '') or year in (None, ''):
+        return None
+    try:
+        return datetime(int(year), int(month), 1)
+    except (TypeError, ValueError):
+        raise RowError(f"month '{month}' / year '{year}' is not a valid month")
+
+
+def master_row(row, default_month=None):
+    """The services document for one spreadsheet row ({normalized header: value}); raises RowError."""
+    doc = {}
+    for header, value in row.items():
+        field = MASTER_COLUMNS.get(header)
+        if field is None or field in doc:
+            continue
+        value = _cell(value)
+        doc[field] = _number(field, value) if field in NUMERIC_FIELDS else value
+    if not doc.get('company'):
+        raise RowError("company is required")
+    if not isinstance(doc.get('S/N'), int):
+        raise RowError(f"S/N '{doc.get('S/N') or ''}' is not a whole number")
+    doc['month_year'] = _row_month(row) or default_month
+    if doc['month_year'] is None:
+        raise RowError("no month: add a month_year (or month and year) column or pick a month")
+    return doc
+
+
+def import_master_list(rows, target, month=None, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """Upsert spreadsheets.iter_rows() output into the master list (`target`) and return a report.
+
+    Each row becomes one services document keyed on (company, S/N,
+    month_year), so a re-imported sheet updates its rows instead of
+    duplicating them. Rows are written with unordered bulk_write upserts,
+    batch_size at a time, while the file is still being read. A row with a
+    problem is skipped and reported by row number without stopping the
+    import; dry_run checks every row and writes nothing.
+    """
+    started = datetime.now()
+    report = {'rows': 0, 'valid': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0,
+              'failed': 0, 'errors': [], 'companies': set(), 'dry_run': dry_run}
+    seen = {}
+    batch = []
+
+    def error(number, message):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_ROW_ERRORS:
+            report['errors'].append({'row': number, 'error': message})
+
+    def flush():
+        if batch and not dry_run:
+            result = target.bulk_write(batch, ordered=False)
+            report['inserted'] += result.upserted_count
+            report['updated'] += result.modified_count
+            report['unchanged'] += result.matched_count - result.modified_count
+        batch.clear()
+
+    for number, row in rows:
+        report['rows'] += 1
+        try:
+            doc = master_row(row, month)
+        except RowError as e:
+            error(number, str(e))
+            continue
+        key = {'company': doc['company'], 'S/N': doc['S/N'], 'month_year': doc['month_year']}
+        seen_key = (doc['company'], doc['S/N'], doc['month_year'])
+        if seen_key in seen:
+            error(number, f"duplicates row {seen[seen_key]} (same company, S/N and month)")
+            continue
+        seen[seen_key] = number
+        report['valid'] += 1
+        report['companies'].add(doc['company'])
+        batch.append(UpdateOne(key, {'$set': doc, '$setOnInsert': {'imported_at': started}}, upsert=True))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    report['companies'] = sorted(report['companies'], key=str)
+    report['duration'] = round((datetime.now() - started).total_seconds(), 2)
+    return report
+
+
+def renumber_order(collection, sort_field):
+    """Set `order` to each document's position when sorted by sort_field, in one bulk_write."""
+    requests = [UpdateOne({'_id': doc['_id']}, {'$set': {'order': index}})
+                for index, doc in enumerate(collection.find({}, {'_id': 1}).sort(sort_field, 1))]
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    return len(requests)
@@ -0,0 +1,187 @@
+import ast
+import os
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.collection import Collection
+import col
+from col import *
+from filters import CASE_INSENSITIVE
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+# Indexes declared per collection in col.py, created by ensure_indexes() (at startup
+# and by `flask --app app ensure-indexes` on deploy). create_indexes is a no-op for
+# indexes that already exist with the same spec. Collections only ever read whole
+# or by _id are declared with an empty list.
+INDEXES = [
+    (collection, [
+        IndexModel([('case_no', ASCENDING)], name='case_no'),
+    ]),
+    (counters_collection, []),
+    (login_collection, [
+        IndexModel([('username', ASCENDING)], name='username'),
+    ]),
+    (login_cust_collection, [
+        IndexModel([('email', ASCENDING)], name='email'),
+    ]),
+    (remark_collection, [
+        IndexModel([('urgent', ASCENDING)], name='urgent'),
+    ]),
+    (services_collection, [
+        IndexModel([('month_year', DESCENDING)], name='month_year'),
+        IndexModel([('company', ASCENDING), ('month_year', DESCENDING)],
+                   name='company_month_year', collation=CASE_INSENSITIVE),
+        IndexModel([('premise_name', ASCENDING), ('month_year', DESCENDING)],
+                   name='premise_month_year', collation=CASE_INSENSITIVE),
+        IndexModel([('Current EO', ASCENDING), ('month_year', DESCENDING)],
+                   name='eo_month_year', collation=CASE_INSENSITIVE),
+        IndexModel([('Model', ASCENDING), ('Color', ASCENDING)],
+                   name='model_color', collation=CASE_INSENSITIVE),
+        IndexModel([('S/N', ASCENDING)], name='sn'),
+        # Exact-match lookups from the cascading dropdowns (no collation)
+        IndexModel([('company', ASCENDING), ('Premise Name', ASCENDING)], name='company_premise_name'),
+        IndexModel([('Premise Name', ASCENDING), ('Model', ASCENDING), ('Color', ASCENDING)],
+                   name='premise_name_model_color'),
+    ]),
+    (eo_list_collection, []),
+    (eo_pack_collection, [
+        IndexModel([('eo_name', ASCENDING)], name='eo_name'),
+        IndexModel([('order', ASCENDING)], name='order'),
+    ]),
+    (model_list_collection, [
+        IndexModel([('model1', ASCENDING)], name='model1'),
+        IndexModel([('order', ASCENDING)], name='order'),
+    ]),
+    (others_list_collection, []),
+    (empty_bottles_list_collection, []),
+    (straw_list_collection, []),
+    (profile_list_collection, [
+        IndexModel([('premise_name', ASCENDING)], name='premise_name'),
+        IndexModel([('company', ASCENDING), ('premise_name', ASCENDING)], name='company_premise'),
+        IndexModel([('company', ASCENDING), ('tied_to_premise', ASCENDING)], name='company_pic_premise'),
+        IndexModel([('tied_to_premise', ASCENDING)], name='tied_to_premise'),
+    ]),
+    (device_list_collection, [
+        IndexModel([('company', ASCENDING), ('S/N', ASCENDING)], name='company_sn'),
+        IndexModel([('S/N', ASCENDING)], name='sn'),  # onboarding duplicate check
+        IndexModel([('tied_to_premise', ASCENDING)], name='tied_to_premise'),
+        IndexModel([('location', ASCENDING)], name='location'),
+    ]),
+    (hierarchy_collection, [
+        IndexModel([('premises.name', ASCENDING)], name='premise_name'),
+        IndexModel([('premises.devices.location', ASCENDING)], name='device_location'),
+    ]),
+    (change_collection, [
+        IndexModel([('premises', ASCENDING), ('submitted_at', DESCENDING)], name='premises_submitted_at'),
+    ]),
+    (refund_collection, []),
+    (route_list_collection, [
+        IndexModel([('date', DESCENDING)], name='date'),
+        IndexModel([('company', ASCENDING), ('premise', ASCENDING), ('date', DESCENDING)],
+                   name='company_premise_date'),
+        IndexModel([('rolled_from', ASCENDING)], name='rolled_from'),
+        IndexModel([('year', ASCENDING), ('month', ASCENDING)], name='year_month'),
+    ]),
+    (logs_collection, [
+        IndexModel([('timestamp', DESCENDING)], name='timestamp'),
+    ]),
+    (mail_outbox_collection, [
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)], name='status_next_attempt'),
+        IndexModel([('dedupe_key', ASCENDING)], name='dedupe_key', unique=True,
+                   partialFilterExpression={'dedupe_key': {'$type': 'string'}}),
+    ]),
+    (job_locks_collection, []),
+    (job_checkpoints_collection, []),
+    (test_collection, []),
+    (db['fs.files'], [
+        IndexModel([('metadata.sha256', ASCENDING)], name='metadata_sha256', sparse=True),
+    ]),
+    (job_runs_collection, [
+        # One run per scheduled occurrence, however many schedulers see it as due
+        IndexModel([('job', ASCENDING), ('scheduled_for', ASCENDING)], name='job_occurrence', unique=True,
+                   partialFilterExpression={'scheduled_for': {'$type': 'date'}}),
+        IndexModel([('job', ASCENDING), ('started_at', DESCENDING)], name='job_started_at'),
+        IndexModel([('started_at', DESCENDING)], name='started_at'),
+    ]),
+]
+
+
+
+def ensure_indexes():
+    """Create every declared index. Failures are printed, not raised, so the app still boots.
+
+    Returns {collection full name: [index names]} for what was declared.
+    """
+    created = {}
+    for collection, indexes in INDEXES:
+        if not indexes:
+            continue
+        try:
+            created[collection.full_name] = collection.create_indexes(indexes)
+        except Exception as e:
+            print(f"Failed to create indexes on {collection.full_name}: {e}")
+    return created
+
+
+# Collection methods and the position of their filter argument
+QUERY_METHODS = {
+    'find': 0, 'find_one': 0, 'count_documents': 0, 'find_one_and_update': 0, 'find_one_and_delete': 0,
+    'update_one': 0, 'update_many': 0, 'replace_one': 0, 'delete_one': 0, 'delete_many': 0, 'distinct': 1,
+}
+
+
+def _filter_fields(node):
+    """Field names a literal filter dict constrains ($and/$or branches included), or None if not literal."""
+    if not isinstance(node, ast.Dict):
+        return None
+    fields = set()
+    for key, value in zip(node.keys, node.values):
+        if not isinstance(key, ast.Constant) or not isinstance(key.value, str):
+            return None
+        if key.value.startswith('$'):
+            for branch in getattr(value, 'elts', []):
+                fields |= _filter_fields(branch) or set()
+        else:
+            fields.add(key.value)
+    return fields
+
+
+def _leading_fields(coll):
+    """First key of every declared index usable without a collation, plus _id."""
+    fields = {'_id'}
+    for declared, indexes in INDEXES:
+        if declared.full_name == coll.full_name:
+            for index in indexes:
+                document = index.document
+                if 'collation' not in document:
+                    fields.add(next(iter(document['key'])))
+    return fields
+
+
+def index_report(path=APP_PATH):
+    """Find queries in app.py with a literal filter that no declared index supports.
+
+    A query counts as supported when some index (without a collation, as
+    app.py queries pass none) starts with one of the filtered fields.
+    Filters built at runtime (compile_filters, build_log_query, ...) are not
+    checked. Returns (unindexed, undeclared): a list of (line, call, fields),
+    and the names of collections in col.py missing from INDEXES.
+    """
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    unindexed = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in QUERY_METHODS and isinstance(node.func.value, ast.Name)):
+            continue
+        coll = getattr(col, node.func.value.id, None)
+        position = QUERY_METHODS[node.func.attr]
+        if not isinstance(coll, Collection) or len(node.args) <= position:
+            continue
+        fields = _filter_fields(node.args[position])
+        if fields and not fields & _leading_fields(coll):
+            unindexed.append((node.lineno, f"{node.func.value.id}.{node.func.attr}", sorted(fields)))
+
+    declared = {declared.full_name for declared, indexes in INDEXES}
+    undeclared = sorted(name for name, value in vars(col).items()
+                        if isinstance(value, Collection) and value.full_name not in declared)
+    return sorted(unindexed), undeclared
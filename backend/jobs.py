@@ -0,0 +1,153 @@
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from apscheduler.triggers.cron import CronTrigger
+from pymongo.errors import DuplicateKeyError
+from col import job_locks_collection, job_runs_collection
+
+LEASE_TTL = 300          # seconds a job lease is held before another runner may take it over
+SCHEDULER_TICK = 30      # seconds between scheduler checks for due jobs
+DEFAULT_MISFIRE_GRACE = 3600
+
+# name -> {'func', 'trigger', 'misfire_grace'}
+JOBS = {}
+
+
+def job(name, misfire_grace=DEFAULT_MISFIRE_GRACE, **cron):
+    """Register a function as a job. Cron fields (day=1, hour=0, ...) make it scheduled."""
+    def register(func):
+        JOBS[name] = {
+            'func': func,
+            'trigger': CronTrigger(**cron) if cron else None,
+            'misfire_grace': misfire_grace,
+        }
+        return func
+    return register
+
+
+def _owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def acquire_lease(name, owner, ttl=LEASE_TTL):
+    """Take the cluster-wide lock for a job. False if another runner holds a live lease."""
+    now = _now()
+    try:
+        job_locks_collection.find_one_and_update(
+            {'_id': name, '$or': [{'expires_at': {'$lte': now}}, {'owner': owner}]},
+            {'$set': {'owner': owner, 'acquired_at': now, 'expires_at': now + timedelta(seconds=ttl)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+def release_lease(name, owner):
+    job_locks_collection.delete_one({'_id': name, 'owner': owner})
+
+
+def _keep_lease(name, owner, stop):
+    # Renew the lease while a long job is still running
+    while not stop.wait(LEASE_TTL / 3):
+        job_locks_collection.update_one(
+            {'_id': name, 'owner': owner},
+            {'$set': {'expires_at': _now() + timedelta(seconds=LEASE_TTL)}},
+        )
+
+
+def run_job(name, trigger='manual', scheduled_for=None):
+    """Run a registered job under its lease and record the run.
+
+    Scheduled runs carry the occurrence they belong to (`scheduled_for`);
+    job_runs has a unique index on (job, scheduled_for), so each occurrence
+    runs exactly once however many runners see it as due. Returns the run
+    record, or None if the job is running elsewhere or already ran.
+    """
+    if name not in JOBS:
+        raise ValueError(f"Unknown job '{name}'")
+    owner = _owner()
+    if not acquire_lease(name, owner):
+        return None
+
+    run = {'job': name, 'trigger': trigger, 'owner': owner, 'status': 'running', 'started_at': _now()}
+    if scheduled_for is not None:
+        run['scheduled_for'] = scheduled_for
+    try:
+        run['_id'] = job_runs_collection.insert_one(run).inserted_id
+    except DuplicateKeyError:
+        release_lease(name, owner)
+        return None
+
+    stop = threading.Event()
+    threading.Thread(target=_keep_lease, args=(name, owner, stop), daemon=True).start()
+    try:
+        result = JOBS[name]['func']()
+        run.update(status='success', result=result)
+    except Exception as e:
+        print(f"Job {name} failed: {e}")
+        run.update(status='failed', error=traceback.format_exc())
+    finally:
+        stop.set()
+        run['finished_at'] = _now()
+        run['duration'] = (run['finished_at'] - run['started_at']).total_seconds()
+        job_runs_collection.update_one({'_id': run['_id']}, {'$set': {
+            k: v for k, v in run.items() if k in ('status', 'result', 'error', 'finished_at', 'duration')
+        }})
+        release_lease(name, owner)
+    return run
+
+
+def due_occurrence(name, now=None):
+    """Latest fire time of a scheduled job within its misfire grace that has not run yet.
+
+    Occurrences missed while no scheduler was up are caught up if they are
+    younger than misfire_grace; several missed occurrences coalesce into one.
+    """
+    spec = JOBS[name]
+    trigger = spec['trigger']
+    if trigger is None:
+        return None
+    now = now or datetime.now(trigger.timezone)
+    latest = None
+    fire = trigger.get_next_fire_time(None, now - timedelta(seconds=spec['misfire_grace']))
+    while fire is not None and fire <= now:
+        latest = fire
+        fire = trigger.get_next_fire_time(fire, fire + timedelta(seconds=1))
+    if latest is None or job_runs_collection.find_one({'job': name, 'scheduled_for': latest}, {'_id': 1}):
+        return None
+    return latest
+
+
+def run_due_jobs():
+    for name in list(JOBS):
+        scheduled_for = due_occurrence(name)
+        if scheduled_for is not None:
+            run_job(name, trigger='schedule', scheduled_for=scheduled_for)
+
+
+def run_scheduler(stop=None):
+    """Blocking scheduler loop. Run one per cluster (e.g. a Procfile process); extra copies are harmless."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            run_due_jobs()
+        except Exception as e:
+            print(f"Scheduler error: {e}")
+        stop.wait(SCHEDULER_TICK)
+
+
+def start_scheduler_thread():
+    thread = threading.Thread(target=run_scheduler, name="job-scheduler", daemon=True)
+    thread.start()
+    return thread
+
+
+def last_runs(limit=20):
+    return list(job_runs_collection.find({}, {'error': 0}).sort('started_at', -1).limit(limit))
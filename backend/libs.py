@@ -1,6 +1,7 @@
-import gridfs, io, os, json, smtplib, base64
-from urllib.parse import urlencode
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, jsonify, Response
+import gridfs, io, os, json, smtplib, base64, threading
+import click
+from urllib.parse import urlencode, parse_qsl
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, jsonify, Response, stream_with_context
 from flask_pymongo import MongoClient
 from werkzeug.security import check_password_hash
 from flask_mail import Mail, Message
@@ -12,7 +13,27 @@ from email.mime.multipart import MIMEMultipart
 from werkzeug.security import generate_password_hash
 from dotenv import load_dotenv
 from bson import ObjectId, json_util
-from utils import log_activity, safe_int, send_email_to_admin, send_email_to_customer, replicate_monthly_routes, flash_message
+from utils import log_activity, safe_int, send_email_to_admin, send_email_to_customer, flash_message
 from flask_cors import CORS
 from collections import defaultdict
-from flask_apscheduler import APScheduler
\ No newline at end of file
+from filters import compile_filters, MASTER_LIST_FILTERS, PROFILE_FILTERS, DEVICE_FILTERS, ROUTE_FILTERS, CASE_INSENSITIVE, parse_int_list
+from pagination import paginate, without_cursors
+from pymongo import ASCENDING, DESCENDING
+from counts import count_entries, invalidate_counts
+from pipelines import run_facet, profile_page_pipeline, device_page_pipeline, route_page_pipeline
+from activity_log import build_log_query, format_log, export_logs_csv, export_logs_ndjson
+from mail_queue import MailWorker
+from reminders import send_service_reminders
+from rollover import rollover_routes
+from sequences import get_sequence
+from media import send_gridfs_file, MEDIA_CACHE_CONTROL, MEDIA_PENDING_CACHE_CONTROL
+from images import ImageVariants
+from signatures import store_signature, migrate_signatures
+from uploads import store_upload, UploadError, MAX_UPLOAD_SIZE
+from refdata import ReferenceCache
+from hierarchy import CompanyHierarchy
+from bootstrap import BootstrapLookups
+from spreadsheets import iter_rows, SpreadsheetError
+from importer import import_master_list, parse_month, renumber_order, RowError, IMPORT_BATCH_SIZE
+from onboarding import parse_onboarding_form, add_spreadsheet_devices, validate_onboarding, write_onboarding, MAX_REPORTED_ERRORS
+from jobs import job, run_job, last_runs, run_scheduler, start_scheduler_thread, JOBS
@@ -0,0 +1,204 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask_mail import Message
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+MAIL_BATCH_SIZE = 50          # messages sent over one SMTP connection
+MAIL_POLL_INTERVAL = 10       # seconds between outbox polls when nothing wakes the worker
+MAIL_MAX_ATTEMPTS = 6
+MAIL_RETRY_BASE = 30          # seconds; doubled on every failed attempt
+MAIL_RETRY_MAX = 3600
+MAIL_STALE_AFTER = 600        # seconds before a 'sending' message from a dead worker is retried
+MAIL_RATE_LIMIT = float(os.getenv('MAIL_RATE_LIMIT') or 5)  # messages per second per worker, 0 = unlimited
+
+
+# Set when a message is queued so this process's worker sends it right away
+_wake = threading.Event()
+
+
+def enqueue_email(outbox, to_email, from_email, subject, body, kind=None, dedupe_key=None, attachments=None):
+    """Persist an outgoing email; the mail worker delivers it after the request returns.
+
+    With a `dedupe_key` the message is only queued once, so reruns of a job
+    never send the same notification twice. `attachments` are GridFS file ids,
+    read by the worker when it sends. Returns True if a new message was queued.
+    """
+    message = {"to": to_email, "from": from_email, "subject": subject, "body": body,
+               "kind": kind, "dedupe_key": dedupe_key, "attachments": attachments}
+    return enqueue_emails(outbox, [message]) > 0
+
+
+def enqueue_emails(outbox, messages):
+    """Queue many emails with one unordered bulk_write.
+
+    Each message is a dict with to/from/subject/body and optionally kind,
+    dedupe_key and attachments; messages whose dedupe_key is already in the outbox are
+    skipped. Returns the number of newly queued messages.
+    """
+    now = datetime.now()
+    requests = []
+    for message in messages:
+        document = {
+            "to": message["to"],
+            "from": message["from"],
+            "subject": message["subject"],
+            "body": message["body"],
+            "kind": message.get("kind"),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        if message.get("attachments"):
+            document["attachments"] = [file_id for file_id in message["attachments"] if file_id]
+        if message.get("dedupe_key"):
+            document["dedupe_key"] = message["dedupe_key"]
+            requests.append(UpdateOne({"dedupe_key": message["dedupe_key"]},
+                                      {"$setOnInsert": document}, upsert=True))
+        else:
+            requests.append(InsertOne(document))
+    if not requests:
+        return 0
+    try:
+        result = outbox.bulk_write(requests, ordered=False)
+        queued = result.upserted_count + result.inserted_count
+    except BulkWriteError as e:
+        # A concurrent run queued the same dedupe_key first; anything else is a real error
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        queued = e.details.get("nUpserted", 0) + e.details.get("nInserted", 0)
+    if queued:
+        _wake.set()
+    return queued
+
+
+def _retry_delay(attempts):
+    return min(MAIL_RETRY_BASE * 2 ** (attempts - 1), MAIL_RETRY_MAX)
+
+
+class MailWorker:
+    """Drains the mail outbox in the background.
+
+    Messages are claimed atomically with find_one_and_update, so several
+    gunicorn workers can run a MailWorker against the same outbox without
+    sending a message twice. Each batch reuses one SMTP connection and sends
+    at most `rate_limit` messages per second, so bulk jobs stay under the
+    SMTP provider's sending limits. Failed
+    messages are retried with exponential backoff up to MAIL_MAX_ATTEMPTS,
+    then marked 'failed' with the last error kept on the document.
+    """
+
+    def __init__(self, app, mail, outbox, fs=None, batch_size=MAIL_BATCH_SIZE, poll_interval=MAIL_POLL_INTERVAL,
+                 rate_limit=MAIL_RATE_LIMIT):
+        self.app = app
+        self.mail = mail
+        self.outbox = outbox
+        self.fs = fs
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.min_interval = 1.0 / rate_limit if rate_limit else 0
+        self._last_send = 0
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="mail-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        _wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.send_batch()
+            except Exception as e:
+                print(f"Mail worker error: {e}")
+                sent = 0
+            if sent < self.batch_size:
+                _wake.wait(self.poll_interval)
+                _wake.clear()
+
+    def _claim(self):
+        now = datetime.now()
+        return self.outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_at": {"$lte": now - timedelta(seconds=MAIL_STALE_AFTER)}},
+            ]},
+            {"$set": {"status": "sending", "locked_at": now, "locked_by": self.worker_id}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _mark_failed(self, message, error):
+        attempts = message.get("attempts", 0) + 1
+        update = {"attempts": attempts, "last_error": str(error), "locked_at": None}
+        if attempts >= MAIL_MAX_ATTEMPTS:
+            update["status"] = "failed"
+        else:
+            update["status"] = "pending"
+            update["next_attempt_at"] = datetime.now() + timedelta(seconds=_retry_delay(attempts))
+        self.outbox.update_one({"_id": message["_id"]}, {"$set": update})
+
+    def _throttle(self):
+        if self.min_interval:
+            wait = self._last_send + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_send = time.monotonic()
+
+    def _attach(self, msg, file_ids):
+        for file_id in file_ids or []:
+            if self.fs is None:
+                raise RuntimeError("Message has attachments but the mail worker has no GridFS")
+            grid_out = self.fs.get(file_id)
+            msg.attach(grid_out.filename or str(file_id),
+                       grid_out.content_type or "application/octet-stream", grid_out.read())
+
+    def send_batch(self):
+        """Claim up to batch_size messages and send them over one SMTP connection."""
+        batch = []
+        while len(batch) < self.batch_size:
+            message = self._claim()
+            if message is None:
+                break
+            batch.append(message)
+        if not batch:
+            return 0
+
+        sent = 0
+        remaining = list(batch)
+        with self.app.app_context():
+            try:
+                with self.mail.connect() as connection:
+                    while remaining:
+                        message = remaining.pop(0)
+                        self._throttle()
+                        try:
+                            msg = Message(message["subject"], sender=message["from"], recipients=[message["to"]])
+                            msg.body = message["body"]
+                            self._attach(msg, message.get("attachments"))
+                            connection.send(msg)
+                        except Exception as e:
+                            self._mark_failed(message, e)
+                            continue
+                        self.outbox.update_one(
+                            {"_id": message["_id"]},
+                            {"$set": {"status": "sent", "sent_at": datetime.now(), "locked_at": None},
+                             "$inc": {"attempts": 1}, "$unset": {"last_error": ""}},
+                        )
+                        sent += 1
+            except Exception as e:
+                # Connecting (or closing) the SMTP session failed; retry what was not sent
+                for message in remaining:
+                    self._mark_failed(message, e)
+        return sent
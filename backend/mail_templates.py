@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+from jinja2 import Environment, StrictUndefined
+
+MAIL_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mail.json')
+RELOAD_CHECK_INTERVAL = 2  # seconds between mtime checks of mail.json
+
+# Plain-text mail, so no HTML autoescaping; missing variables raise instead of rendering blank
+_env = Environment(autoescape=False, undefined=StrictUndefined, keep_trailing_newline=True)
+
+
+def parse_template_file(text):
+    """Parse mail.json: a JSON array, or template objects simply written one after another."""
+    text = text.strip()
+    if not text:
+        return []
+    if text.startswith('['):
+        return json.loads(text)
+    decoder = json.JSONDecoder()
+    entries, pos = [], 0
+    while pos < len(text):
+        entry, pos = decoder.raw_decode(text, pos)
+        entries.append(entry)
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+    return entries
+
+
+class MailTemplate:
+    def __init__(self, entry):
+        self.name = entry['name']
+        self.type = entry.get('type', 'plain')
+        self.active = entry.get('active', True)
+        self.subject = _env.from_string(entry.get('subject', ''))
+        self.body = _env.from_string(entry.get('body', ''))
+
+    def render(self, **context):
+        return self.subject.render(context), self.body.render(context)
+
+
+class MailTemplateRegistry:
+    """Notification templates from mail.json, compiled once and reloaded when the file changes.
+
+    The file is stat'ed at most every RELOAD_CHECK_INTERVAL seconds, so
+    rendering in a tight loop (bulk reminders) only pays for the render.
+    A missing or broken file keeps the last good set of templates.
+    """
+
+    def __init__(self, path=MAIL_TEMPLATES_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._templates = {}
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    entries = parse_template_file(f.read())
+                self._templates = {entry['name']: MailTemplate(entry) for entry in entries}
+                self._mtime = mtime
+            except Exception as e:
+                print(f"Failed to load mail templates from {self.path}: {e}")
+
+    def get(self, name):
+        """The named template, or None if it does not exist or is inactive."""
+        self._maybe_reload()
+        template = self._templates.get(name)
+        return template if template is not None and template.active else None
+
+    def names(self):
+        self._maybe_reload()
+        return sorted(self._templates)
+
+    def render(self, name, **context):
+        """(subject, body) for the named template, or None if it is missing or inactive."""
+        template = self.get(name)
+        return template.render(**context) if template else None
+
+    def render_many(self, name, contexts):
+        """Yield (context, subject, body) for each context, compiling/looking up the template once."""
+        template = self.get(name)
+        if template is None:
+            return
+        for context in contexts:
+            subject, body = template.render(**context)
+            yield context, subject, body
+
+
+mail_templates = MailTemplateRegistry()
@@ -0,0 +1,98 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response, abort, request
+from gridfs.errors import NoFile
+from werkzeug.http import is_resource_modified
+
+# GridFS files are never modified in place (an edit uploads a new file with a new id),
+# so a file id names immutable content and browsers may keep it for a year.
+MEDIA_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# Sent when a requested variant is still being built: the original stands in for it,
+# so browsers must revalidate (the ETag changes once the variant exists)
+MEDIA_PENDING_CACHE_CONTROL = "private, no-cache"
+
+
+def media_etag(grid_out):
+    """Strong validator for a GridFS file: its content hash if known, else id + upload time."""
+    metadata = grid_out.metadata or {}
+    digest = metadata.get('sha256') or getattr(grid_out, 'md5', None)
+    if digest:
+        return digest
+    return f"{grid_out._id}-{int(grid_out.upload_date.timestamp() * 1000)}"
+
+
+def _stream(grid_out, start, length, chunk_size):
+    # Read one GridFS chunk at a time so a worker never holds the whole file
+    try:
+        grid_out.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = grid_out.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        grid_out.close()
+
+
+def send_gridfs_file(fs, file_id, default_mimetype='application/octet-stream', variant=None):
+    """Stream a GridFS file with ETag/Last-Modified validation, Range support and long-lived caching.
+
+    With `variant` ('thumb', 'display') the stored resized copy is sent when
+    one exists (see images.py), otherwise the original. The original is only
+    cached long-term under a variant URL once the variants have been built
+    (and this one was skipped); while they are pending it must be revalidated.
+    """
+    try:
+        grid_out = fs.get(ObjectId(file_id))
+    except (InvalidId, TypeError, NoFile):
+        abort(404)
+    cache_control = MEDIA_CACHE_CONTROL
+    if variant:
+        variants = (grid_out.metadata or {}).get('variants')
+        variant_id = (variants or {}).get(variant)
+        if variant_id:
+            try:
+                grid_out = fs.get(variant_id)
+            except NoFile:
+                cache_control = MEDIA_PENDING_CACHE_CONTROL
+        elif variants is None:
+            cache_control = MEDIA_PENDING_CACHE_CONTROL
+
+    etag = media_etag(grid_out)
+    last_modified = grid_out.upload_date
+    mimetype = (getattr(grid_out, 'content_type', None)
+                or (grid_out.metadata or {}).get('content_type') or default_mimetype)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        grid_out.close()
+        response = Response(status=304)
+    else:
+        length = grid_out.length
+        start, stop = 0, length
+        status = 200
+        # A Range is honoured unless If-Range names another version of the file (or uses a date)
+        byte_range = request.range
+        if_range = request.if_range
+        if byte_range is not None and (not (if_range.etag or if_range.date) or if_range.etag == etag):
+            span = byte_range.range_for_length(length)
+            if span is None:
+                grid_out.close()
+                response = Response(status=416)
+                response.headers['Content-Range'] = f"bytes */{length}"
+                return response
+            start, stop = span
+            status = 206
+
+        response = Response(_stream(grid_out, start, stop - start, grid_out.chunk_size),
+                            status=status, mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stop - start
+        if status == 206:
+            response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{length}"
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = cache_control
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
@@ -0,0 +1,46 @@
+import threading
+import time
+from col import *
+
+DASHBOARD_TTL = 15  # seconds the dashboard counters are reused
+
+_dashboard = {'at': 0, 'metrics': None}
+_lock = threading.Lock()
+
+
+def _remark_counts():
+    """(non_urgent, urgent) remark counts: an index count of urgent ones and the total from metadata."""
+    # /remarks always stores `urgent` as a bool, so the urgent index answers this without touching documents
+    urgent = remark_collection.count_documents({'urgent': True})
+    return max(remark_collection.estimated_document_count() - urgent, 0), urgent
+
+
+def get_dashboard_metrics():
+    """Counters shown on the dashboard, cached for DASHBOARD_TTL seconds.
+
+    Unfiltered totals come from collection metadata, so the cost does not grow
+    with the number of cases, change records or refunds.
+    """
+    now = time.monotonic()
+    with _lock:
+        if _dashboard['metrics'] is not None and now - _dashboard['at'] < DASHBOARD_TTL:
+            return dict(_dashboard['metrics'])
+
+    remarks_count, urgent_remarks_count = _remark_counts()
+    metrics = {
+        'remarks_count': remarks_count,
+        'urgent_remarks_count': urgent_remarks_count,
+        'help_request_count': collection.estimated_document_count(),
+        'change_count': change_collection.estimated_document_count(),
+        'refund_count': refund_collection.estimated_document_count(),
+    }
+    with _lock:
+        _dashboard['at'] = now
+        _dashboard['metrics'] = metrics
+    return dict(metrics)
+
+
+def invalidate_dashboard_metrics():
+    """Drop the cached counters after writing remarks, cases, changes or refunds."""
+    with _lock:
+        _dashboard['metrics'] = None
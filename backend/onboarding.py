@@ -0,0 +1,226 @@
+from datetime import datetime
+from pymongo import InsertOne
+from pymongo.errors import OperationFailure
+from utils import safe_int
+
+EVENT_FIELDS = [('DAYS', 'Days'), ('START', 'StartTime'), ('END', 'EndTime'), ('PAUSE', 'Pause'), ('WORK', 'Work')]
+
+# Device field -> new-customer form field prefix (suffixed with the device number)
+DEVICE_FORM_FIELDS = {
+    'tied_to_premise': 'devicePremise',
+    'location': 'deviceLocation',
+    'S/N': 'deviceSN',
+    'Model': 'deviceModel',
+    'Color': 'deviceColour',
+    'Volume': 'deviceVolume',
+    'Current EO': 'deviceScent',
+    **{f"E{n} - {field}": f"E{n}{form_field}" for n in range(1, 5) for field, form_field in EVENT_FIELDS},
+}
+NUMERIC_DEVICE_FIELDS = {'S/N', 'Volume'} | {f"E{n} - {field}" for n in range(1, 5) for field in ('PAUSE', 'WORK')}
+
+# Normalized spreadsheet header -> device field. Every device field also matches its own name.
+DEVICE_COLUMNS = {
+    **{field.lower(): field for field in DEVICE_FORM_FIELDS},
+    'premise': 'tied_to_premise',
+    'premise name': 'tied_to_premise',
+    'device location': 'location',
+    'sn': 'S/N',
+    'serial number': 'S/N',
+    'colour': 'Color',
+    'scent': 'Current EO',
+    'eo': 'Current EO',
+}
+
+MAX_REPORTED_ERRORS = 10
+
+
+def make_device(company, values, now=None):
+    """A device record in the device collection's field order from {device field: raw value}."""
+    device = {'company': company}
+    for field in DEVICE_FORM_FIELDS:
+        value = values.get(field)
+        if value is not None and not isinstance(value, (int, float)):
+            value = str(value).strip() or None
+        if field in NUMERIC_DEVICE_FIELDS and isinstance(value, float) and value.is_integer():
+            value = int(value)  # spreadsheet numbers arrive as floats
+        device[field] = safe_int(value) if field in NUMERIC_DEVICE_FIELDS else value
+    device['created_at'] = now or datetime.now()
+    return device
+
+
+def parse_onboarding_form(form, now=None):
+    """Onboarding payload from the /new-customer form: company details, premises, PICs and devices.
+
+    Devices are (label, record) pairs so validation errors can point at the
+    form entry or spreadsheet row they came from.
+    """
+    now = now or datetime.now()
+    date_str = form.get("dateCreated")
+    company = (form.get("companyName") or '').strip()
+    industry = form.get("industry")
+    payload = {
+        'company': company,
+        'industry': industry,
+        'date_created': datetime.strptime(date_str, "%Y-%m-%d") if date_str else None,
+        'premises': [],
+        'pics': [],
+        'devices': [],
+        'errors': [],
+    }
+
+    k = 1
+    while form.get(f'premiseName{k}'):
+        payload['premises'].append({
+            "company": company,
+            "month_year": now,
+            "industry": industry,
+            "premise_name": form.get(f'premiseName{k}').strip(),
+            "premise_area": form.get(f'premiseArea{k}'),
+            "premise_address": form.get(f'premiseAddress{k}'),
+            "created_at": now,
+        })
+        k += 1
+
+    i = 1
+    while form.get(f'picName{i}'):
+        payload['pics'].append({
+            "company": company,
+            "tied_to_premise": form.get(f'contactPremise{i}'),  # a premise name or "all"
+            "name": form.get(f'picName{i}'),
+            "designation": form.get(f'picDesignation{i}'),
+            "contact": form.get(f'picContact{i}'),
+            "email": form.get(f'picEmail{i}'),
+            "created_at": now,
+        })
+        i += 1
+
+    j = 1
+    while form.get(f'deviceSN{j}'):
+        values = {field: form.get(f"{prefix}{j}") for field, prefix in DEVICE_FORM_FIELDS.items()}
+        payload['devices'].append((f"Device {j}", make_device(company, values, now)))
+        j += 1
+    return payload
+
+
+def add_spreadsheet_devices(payload, rows, now=None):
+    """Append devices from spreadsheets.iter_rows() output to the payload; returns how many were read."""
+    now = now or datetime.now()
+    count = 0
+    for number, row in rows:
+        values = {}
+        for header, value in row.items():
+            field = DEVICE_COLUMNS.get(header)
+            if field and field not in values:
+                values[field] = value
+        payload['devices'].append((f"Row {number}", make_device(payload['company'], values, now)))
+        count += 1
+    if not count:
+        payload['errors'].append("The device spreadsheet has no rows.")
+    return count
+
+
+def validate_onboarding(payload, devices):
+    """Every problem with the payload as a list of messages (empty if it can be written).
+
+    Checks run before anything is written: a company name, at least one
+    premise and device, unique premise names, PICs and devices tied to a
+    premise of this company, and whole serial numbers that are unique in the
+    payload and not already registered (one $in query on the device collection).
+    """
+    errors = list(payload['errors'])
+    if not payload['company']:
+        errors.append("Company name is required.")
+    if not payload['premises']:
+        errors.append("Add at least one premise.")
+    if not payload['devices']:
+        errors.append("Add at least one device.")
+
+    premise_names = set()
+    for premise in payload['premises']:
+        if premise['premise_name'] in premise_names:
+            errors.append(f"Premise '{premise['premise_name']}' is listed more than once.")
+        premise_names.add(premise['premise_name'])
+
+    for pic in payload['pics']:
+        premise = pic['tied_to_premise']
+        if premise and premise != "all" and premise not in premise_names:
+            errors.append(f"PIC {pic['name']}: premise '{premise}' is not one of this company's premises.")
+
+    serials = {}
+    for label, device in payload['devices']:
+        sn = device['S/N']
+        if not isinstance(sn, int):
+            errors.append(f"{label}: S/N '{sn or ''}' is not a whole number.")
+        elif sn in serials:
+            errors.append(f"{label}: S/N {sn} is already used by {serials[sn]}.")
+        else:
+            serials[sn] = label
+        if device['tied_to_premise'] not in premise_names:
+            errors.append(f"{label}: premise '{device['tied_to_premise'] or ''}' is not one of this company's premises.")
+
+    if serials:
+        for existing in devices.find({'S/N': {'$in': list(serials)}}, {'S/N': 1, 'company': 1}):
+            errors.append(f"{serials[existing['S/N']]}: S/N {existing['S/N']} is already registered to {existing.get('company')}.")
+    return errors
+
+
+def build_master_rows(payload):
+    """One master-list row per device with its premise, its primary PIC flattened and all its PICs in `pics`."""
+    premises = {premise['premise_name']: premise for premise in payload['premises']}
+    rows = []
+    for _, device in payload['devices']:
+        premise = device['tied_to_premise']
+        pics = [pic for pic in payload['pics'] if pic['tied_to_premise'] in (premise, "all")]
+        row = {
+            "company": payload['company'],
+            "industry": payload['industry'],
+            "month_year": payload['date_created'],
+            **premises.get(premise, {}),
+            **(pics[0] if pics else {}),
+            **device,
+        }
+        row['pics'] = [{key: pic[key] for key in ('name', 'designation', 'contact', 'email')} for pic in pics]
+        row.pop('_id', None)
+        rows.append(row)
+    return rows
+
+
+def write_onboarding(payload, profiles, devices, master, use_transactions=True):
+    """Write a validated payload with one bulk_write per collection and return the counts written.
+
+    Premises and PICs go to `profiles`, devices to `devices` and the master
+    rows to `master`. All three writes share a transaction when the
+    deployment supports one; on a standalone server they run in order
+    without it, which validation up front makes safe in practice.
+    """
+    master_rows = build_master_rows(payload)
+    writes = [
+        (profiles, [InsertOne(doc) for doc in payload['premises'] + payload['pics']]),
+        (devices, [InsertOne(device) for _, device in payload['devices']]),
+        (master, [InsertOne(row) for row in master_rows]),
+    ]
+
+    def apply(session=None):
+        for collection, requests in writes:
+            if requests:
+                collection.bulk_write(requests, session=session)
+
+    if use_transactions:
+        try:
+            with profiles.database.client.start_session() as session:
+                session.with_transaction(lambda s: apply(session=s))
+        except OperationFailure as e:
+            # Standalone servers have no transactions (IllegalOperation); nothing was written
+            if e.code != 20:
+                raise
+            print("Transactions unavailable; writing onboarding without one")
+            apply()
+    else:
+        apply()
+
+    return {
+        'premises': len(payload['premises']),
+        'pics': len(payload['pics']),
+        'devices': len(payload['devices']),
+        'master_rows': len(master_rows),
+    }
@@ -0,0 +1,129 @@
+import base64
+from datetime import datetime
+from bson import Binary, Decimal128, Int64, ObjectId, Timestamp, json_util
+from pymongo import ASCENDING
+
+# `before` value that asks for the last page: read backwards from the end instead of skipping
+LAST_PAGE = 'last'
+
+# BSON comparison order of the types a sort key can hold ($type aliases). $gt/$lt only
+# compare within one bracket, so seeking past a value must add the later brackets.
+TYPE_BRACKETS = ['number', 'string', 'object', 'binData', 'objectId', 'bool', 'date', 'timestamp']
+
+
+def _bracket(value):
+    if isinstance(value, bool):
+        return TYPE_BRACKETS.index('bool')
+    if isinstance(value, (int, float, Int64, Decimal128)):
+        return TYPE_BRACKETS.index('number')
+    for types, alias in ((str, 'string'), (dict, 'object'), ((bytes, Binary), 'binData'),
+                         (ObjectId, 'objectId'), (datetime, 'date'), (Timestamp, 'timestamp')):
+        if isinstance(value, types):
+            return TYPE_BRACKETS.index(alias)
+    return None
+
+
+def encode_cursor(doc, sort_key):
+    """Opaque token holding the sort position of `doc` (sort value + _id tie-breaker)."""
+    raw = json_util.dumps([doc.get(sort_key), doc['_id']]).encode()
+    # Padding is stripped to keep the token short and URL-safe
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor. Returns None for blank or tampered tokens."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, last_id = json_util.loads(raw)
+        return value, last_id
+    except Exception:
+        return None
+
+
+def _beyond(sort_key, value, last_id, direction):
+    """Condition selecting documents strictly after (value, last_id) in `direction`.
+
+    Mongo sorts null/missing values before everything else, and $gt/$lt never
+    match them, so they are handled explicitly: ascending they come first,
+    descending last. $gt/$lt also stay within the value's BSON type, so values
+    of the types sorted after it (e.g. legacy string timestamps, which sort
+    before dates) are added with $type.
+    """
+    op = '$gt' if direction == ASCENDING else '$lt'
+    if sort_key == '_id':
+        return {'_id': {op: last_id}}
+    same_value = {sort_key: value, '_id': {op: last_id}}
+    if value is None:
+        if direction == ASCENDING:
+            return {'$or': [{sort_key: {'$ne': None}}, same_value]}
+        return same_value
+    conditions = [{sort_key: {op: value}}, same_value]
+    bracket = _bracket(value)
+    if bracket is not None:
+        later = TYPE_BRACKETS[bracket + 1:] if direction == ASCENDING else TYPE_BRACKETS[:bracket]
+        if later:
+            conditions.append({sort_key: {'$type': later}})
+    if direction != ASCENDING:
+        conditions.append({sort_key: None})
+    return {'$or': conditions}
+
+
+def paginate(collection, query, page, limit, after=None, before=None,
+             sort_key='_id', direction=ASCENDING, projection=None, collation=None):
+    """Fetch one page of `query` ordered by (sort_key, _id).
+
+    With an `after`/`before` token the page is found by seeking past the token's
+    position (keyset), so deep pages cost the same as the first one, and
+    before=LAST_PAGE reads the last `limit` documents backwards from the end.
+    Without a token it falls back to skip/limit, which is fine for the shallow
+    page-number links. Returns (docs, cursors) where cursors holds the 'next'/'prev' tokens.
+    """
+    hide_id = False
+    if projection and projection.get('_id') == 0:
+        # _id is needed for the cursor; strip it again before returning
+        projection = {k: v for k, v in projection.items() if k != '_id'} or None
+        hide_id = True
+
+    order = direction
+    last_page = before == LAST_PAGE and not after
+    position = None if last_page else decode_cursor(after)
+    if last_page:
+        order = -direction
+    elif position is None:
+        position = decode_cursor(before)
+        if position is not None:
+            order = -direction
+
+    sort = [(sort_key, order)] if sort_key == '_id' else [(sort_key, order), ('_id', order)]
+
+    if position is not None:
+        filter_ = {'$and': [query, _beyond(sort_key, position[0], position[1], order)]} if query \
+            else _beyond(sort_key, position[0], position[1], order)
+        docs = list(collection.find(filter_, projection, collation=collation).sort(sort).limit(limit))
+        if order != direction:
+            docs.reverse()
+    elif last_page:
+        docs = list(collection.find(query, projection, collation=collation).sort(sort).limit(limit))
+        docs.reverse()
+    else:
+        docs = list(collection.find(query, projection, collation=collation)
+                    .sort(sort).skip(max(page - 1, 0) * limit).limit(limit))
+
+    cursors = {'next': '', 'prev': ''}
+    if docs:
+        cursors['prev'] = encode_cursor(docs[0], sort_key)
+        cursors['next'] = encode_cursor(docs[-1], sort_key)
+
+    if hide_id:
+        for doc in docs:
+            doc.pop('_id', None)
+    return docs, cursors
+
+
+def without_cursors(params, prefix=''):
+    """Drop a table's cursor tokens so its page-number links use page mode."""
+    params.pop(prefix + 'after', None)
+    params.pop(prefix + 'before', None)
+    return params
@@ -0,0 +1,176 @@
+import re
+
+
+def facet_page(page, limit, page_stages=None):
+    """$facet stage returning one page of documents plus the total match count.
+
+    `page_stages` run after skip/limit, so joins and reshaping only touch the
+    documents that are actually rendered.
+    """
+    return {'$facet': {
+        'data': [{'$skip': max(page - 1, 0) * limit}, {'$limit': limit}] + (page_stages or []),
+        'total': [{'$count': 'count'}],
+    }}
+
+
+def run_facet(collection, pipeline):
+    """Run a pipeline ending in facet_page() and return (docs, total)."""
+    result = next(collection.aggregate(pipeline, allowDiskUse=True), None)
+    if not result:
+        return [], 0
+    total = result['total'][0]['count'] if result['total'] else 0
+    return result['data'], total
+
+
+def pics_lookup(collection_name, company, premise_name, as_field, extra_stages=None):
+    """$lookup of the PIC records for a premise, including PICs tied to "all" premises."""
+    return {'$lookup': {
+        'from': collection_name,
+        'let': {'company': company, 'premise_name': premise_name},
+        'pipeline': [
+            {'$match': {'$expr': {'$and': [
+                {'$eq': ['$company', '$$company']},
+                {'$in': ['$tied_to_premise', ['$$premise_name', 'all']]},
+            ]}}},
+            *(extra_stages or [{'$project': {'_id': 0, 'name': 1, 'designation': 1, 'contact': 1, 'email': 1}}]),
+        ],
+        'as': as_field,
+    }}
+
+
+def profile_page_pipeline(collection_name, query, pic, page, limit):
+    """Premises grouped by (company, premise_name) with their PICs, one page at a time.
+
+    `query` filters the premise records. PIC records are joined with $lookup
+    (including PICs registered against "all" premises of the company) only for
+    the premises on the requested page. When `pic` is given, premises are kept
+    only if one of their PICs' names starts with it.
+    """
+    pipeline = [
+        {'$match': {'premise_name': {'$exists': True}, **query}},
+        {'$sort': {'_id': 1}},
+        {'$group': {
+            '_id': {'company': '$company', 'premise_name': '$premise_name'},
+            'record_id': {'$last': '$_id'},
+            'industry': {'$last': '$industry'},
+            'premise_area': {'$last': '$premise_area'},
+            'premise_address': {'$last': '$premise_address'},
+            'created_at': {'$last': '$created_at'},
+        }},
+        {'$sort': {'_id.company': 1, '_id.premise_name': 1}},
+    ]
+
+    if pic:
+        pipeline += [
+            pics_lookup(collection_name, '$_id.company', '$_id.premise_name', 'matching_pics', [
+                {'$match': {'name': {'$regex': '^' + re.escape(pic), '$options': 'i'}}},
+                {'$limit': 1},
+            ]),
+            {'$match': {'matching_pics': {'$ne': []}}},
+        ]
+
+    pipeline.append(facet_page(page, limit, [
+        pics_lookup(collection_name, '$_id.company', '$_id.premise_name', 'pics'),
+        {'$project': {
+            '_id': {'$toString': '$record_id'},
+            'company': '$_id.company',
+            'industry': {'$ifNull': ['$industry', '']},
+            'premise_name': '$_id.premise_name',
+            'premise_area': {'$ifNull': ['$premise_area', '']},
+            'premise_address': {'$ifNull': ['$premise_address', '']},
+            'month': {'$ifNull': [{'$month': '$created_at'}, '']},
+            'year': {'$ifNull': [{'$year': '$created_at'}, '']},
+            'pics': 1,
+        }},
+    ]))
+    return pipeline
+
+
+# Template key -> device document field for the columns shown on /view-device
+DEVICE_COLUMNS = {
+    'company': 'company',
+    'tied_to_premise': 'tied_to_premise',
+    'sn': 'S/N',
+    'model': 'Model',
+    'color': 'Color',
+    'current_eo': 'Current EO',
+    **{
+        f'e{n}_{key}': f'E{n} - {field}'
+        for n in range(1, 5)
+        for key, field in [('days', 'DAYS'), ('start', 'START'), ('end', 'END'), ('pause', 'PAUSE'), ('work', 'WORK')]
+    },
+}
+
+
+def device_page_pipeline(query, page, limit):
+    """Devices grouped by (company, S/N), latest record winning, one page at a time.
+
+    Only the displayed columns are carried through the group, and the
+    reshaping to template keys happens after skip/limit.
+    """
+    return [
+        {'$match': {'S/N': {'$exists': True}, **query}},
+        {'$sort': {'_id': 1}},
+        {'$project': {**{field: 1 for field in DEVICE_COLUMNS.values()}, 'created_at': 1}},
+        {'$group': {
+            '_id': {'company': '$company', 'sn': '$S/N'},
+            'doc': {'$last': '$$ROOT'},
+        }},
+        {'$sort': {'_id.company': 1, '_id.sn': 1}},
+        facet_page(page, limit, [
+            {'$project': {
+                '_id': 0,
+                **{key: {'$ifNull': ['$doc.' + field, '']} for key, field in DEVICE_COLUMNS.items()},
+                'created_at_month': {'$ifNull': [{'$month': '$doc.created_at'}, '']},
+                'created_at_year': {'$ifNull': [{'$year': '$doc.created_at'}, '']},
+            }},
+        ]),
+    ]
+
+
+def route_page_pipeline(profile_collection_name, query, sort_order, page, limit):
+    """Latest route per (company, premise) in `sort_order`, one page at a time.
+
+    Premise details and PICs are joined from the profile collection after
+    skip/limit, so a page costs one round trip however many routes it shows.
+    """
+    return [
+        {'$match': query},
+        # Newest first so $first keeps each premise's latest route; sort_order applies to the groups
+        {'$sort': {'date': -1, '_id': -1}},
+        {'$group': {
+            '_id': {'company': '$company', 'premise': '$premise'},
+            'route': {'$first': '$$ROOT'},
+        }},
+        {'$sort': {'route.date': sort_order, 'route._id': sort_order}},
+        facet_page(page, limit, [
+            {'$lookup': {
+                'from': profile_collection_name,
+                'let': {'company': '$_id.company', 'premise_name': '$_id.premise'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$and': [
+                        {'$eq': ['$company', '$$company']},
+                        {'$eq': ['$premise_name', '$$premise_name']},
+                    ]}}},
+                    {'$project': {'_id': 0, 'premise_area': 1, 'premise_address': 1}},
+                    {'$limit': 1},
+                ],
+                'as': 'premise',
+            }},
+            pics_lookup(profile_collection_name, '$_id.company', '$_id.premise', 'pics'),
+            {'$project': {
+                '_id': {'$toString': '$route._id'},
+                'company': {'$ifNull': ['$_id.company', '']},
+                'premise_name': {'$ifNull': ['$_id.premise', '']},
+                'premise_area': {'$ifNull': [{'$arrayElemAt': ['$premise.premise_area', 0]}, '']},
+                'premise_address': {'$ifNull': [{'$arrayElemAt': ['$premise.premise_address', 0]}, '']},
+                'pics': 1,
+                'model': {'$ifNull': ['$route.model', '']},
+                'color': {'$ifNull': ['$route.color', '']},
+                'eo': {'$ifNull': ['$route.eo', '']},
+                'day': {'$ifNull': [{'$dayOfMonth': '$route.date'}, '']},
+                'month': {'$ifNull': [{'$month': '$route.date'}, '']},
+                'year': {'$ifNull': [{'$year': '$route.date'}, '']},
+            }},
+        ]),
+    ]
@@ -0,0 +1,81 @@
+import threading
+import time
+from pymongo import ReturnDocument
+
+REFERENCE_TTL = 300            # seconds a reference list is reused without any write
+VERSION_CHECK_INTERVAL = 2     # seconds between checks of the shared version counters
+
+
+class ReferenceCache:
+    """Read-through, process-local cache for small reference lists (models, EOs, companies).
+
+    Each list has a loader; the first get() runs it and later calls reuse the
+    result for up to `ttl` seconds. invalidate() drops a list after a write.
+    With a `versions` collection, invalidate() also bumps a counter document
+    ('refdata:<name>') there, and every process re-reads the counters at most
+    every VERSION_CHECK_INTERVAL seconds (one _id lookup for all lists), so an
+    edit made through one gunicorn worker reaches the others within seconds.
+    Returned values are shared; callers must not modify them.
+    """
+
+    def __init__(self, versions=None, ttl=REFERENCE_TTL, check_interval=VERSION_CHECK_INTERVAL):
+        self.versions = versions
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._loaders = {}
+        self._entries = {}   # name -> (loaded_at, version, value)
+        self._known_versions = {}
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        self._loaders[name] = loader
+        return loader
+
+    def loader(self, name):
+        """Decorator form of register()."""
+        def decorate(func):
+            return self.register(name, func)
+        return decorate
+
+    def _refresh_versions(self, now):
+        if self.versions is None or now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            ids = [f"refdata:{name}" for name in self._loaders]
+            found = {doc['_id'][len('refdata:'):]: doc.get('value', 0)
+                     for doc in self.versions.find({'_id': {'$in': ids}})}
+        except Exception as e:
+            print(f"Failed to read reference data versions: {e}")
+            return
+        self._known_versions = {name: found.get(name, 0) for name in self._loaders}
+
+    def get(self, name):
+        now = time.monotonic()
+        with self._lock:
+            self._refresh_versions(now)
+            version = self._known_versions.get(name, 0)
+            entry = self._entries.get(name)
+            if entry is not None and now - entry[0] < self.ttl and entry[1] == version:
+                return entry[2]
+        value = self._loaders[name]()
+        with self._lock:
+            self._entries[name] = (now, version, value)
+        return value
+
+    def invalidate(self, *names):
+        with self._lock:
+            for name in names:
+                self._entries.pop(name, None)
+        if self.versions is not None:
+            for name in names:
+                try:
+                    counter = self.versions.find_one_and_update(
+                        {'_id': f"refdata:{name}"}, {'$inc': {'value': 1}},
+                        upsert=True, return_document=ReturnDocument.AFTER,
+                    )
+                    with self._lock:
+                        self._known_versions[name] = counter['value']
+                except Exception as e:
+                    print(f"Failed to bump reference data version for {name}: {e}")
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from mail_queue import enqueue_emails
+from mail_templates import mail_templates
+from pipelines import pics_lookup
+
+SERVICE_REMINDER_TEMPLATE = "monthly_servicing_upcoming_servicing_date"
+SERVICE_REMINDER_DAYS_AHEAD = 3
+REMINDER_BATCH_SIZE = 1000
+
+
+def service_reminder_pipeline(profile_collection_name, start, end):
+    """One row per (route, PIC email) for routes dated in [start, end)."""
+    return [
+        {'$match': {'date': {'$gte': start, '$lt': end}}},
+        pics_lookup(profile_collection_name, '$company', '$premise', 'pics', [
+            {'$match': {'email': {'$nin': [None, '']}}},
+            {'$project': {'_id': 0, 'name': 1, 'email': 1}},
+        ]),
+        {'$unwind': '$pics'},
+        {'$project': {
+            'company': 1,
+            'premise': 1,
+            'date': 1,
+            'pic_name': '$pics.name',
+            'email': '$pics.email',
+        }},
+    ]
+
+
+def send_service_reminders(routes, profile_collection_name, outbox, from_email,
+                           days_ahead=SERVICE_REMINDER_DAYS_AHEAD, today=None):
+    """Queue an upcoming-service email to every PIC of premises serviced `days_ahead` days from today.
+
+    Routes and PICs are joined in one aggregation, messages are rendered from
+    mail.json and queued with bulk writes; the mail worker sends them in
+    rate-limited batches. Each message is keyed on (route, date, email), so
+    running the job again for the same day queues nothing new.
+    Returns a summary dict.
+    """
+    started = datetime.now()
+    today = (today or started).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today + timedelta(days=days_ahead)
+    end = start + timedelta(days=1)
+
+    summary = {'date': start.strftime('%Y-%m-%d'), 'recipients': 0, 'queued': 0, 'errors': 0}
+    template = mail_templates.get(SERVICE_REMINDER_TEMPLATE)
+    if template is None:
+        print(f"Mail template {SERVICE_REMINDER_TEMPLATE} is missing or inactive; no reminders sent")
+        return summary
+
+    batch = []
+    rows = routes.aggregate(service_reminder_pipeline(profile_collection_name, start, end), batchSize=REMINDER_BATCH_SIZE)
+    for row in rows:
+        summary['recipients'] += 1
+        try:
+            subject, body = template.render(
+                premise_name=row.get('premise', ''),
+                service_date=row['date'].strftime('%d %B %Y'),
+                company=row.get('company', ''),
+                pic_name=row.get('pic_name', ''),
+            )
+        except Exception as e:
+            summary['errors'] += 1
+            print(f"Failed to render service reminder for route {row['_id']}: {e}")
+            continue
+        batch.append({
+            'to': row['email'],
+            'from': from_email,
+            'subject': subject,
+            'body': body,
+            'kind': 'service_reminder',
+            'dedupe_key': f"service_reminder:{row['_id']}:{row['date']:%Y-%m-%d}:{row['email'].lower()}",
+        })
+        if len(batch) >= REMINDER_BATCH_SIZE:
+            summary['queued'] += enqueue_emails(outbox, batch)
+            batch = []
+    if batch:
+        summary['queued'] += enqueue_emails(outbox, batch)
+
+    summary['duration'] = round((datetime.now() - started).total_seconds(), 2)
+    return summary
@@ -0,0 +1,129 @@
+import calendar
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
+
+ROLLOVER_BATCH_SIZE = 500
+
+
+def _previous_month(year, month):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def source_route_query(year, month):
+    """Routes of the given month: dated ones by `date`, older ones by their month/year fields."""
+    start = datetime(year, month, 1)
+    end = datetime(*_next_month(year, month), 1)
+    return {'$or': [
+        {'date': {'$gte': start, '$lt': end}},
+        {'date': {'$exists': False}, 'month': month, 'year': year},
+    ]}
+
+
+def rolled_route(route, year, month):
+    """Copy of `route` moved to year/month, keeping its day (clamped to the month's length) and time."""
+    source_date = route.get('date')
+    day = min(source_date.day if source_date else route.get('day', 1), calendar.monthrange(year, month)[1])
+    new_route = {key: value for key, value in route.items() if key != '_id'}
+    new_route['date'] = source_date.replace(year=year, month=month, day=day) if source_date else datetime(year, month, day)
+    new_route['premise'] = route.get('premise') or route.get('premise_name')
+    new_route.update(day=day, month=month, year=year, rolled_from=route['_id'])
+    return new_route
+
+
+def _apply_batch(routes, checkpoints, checkpoint_id, batch, year, month, keep_source, session=None):
+    # Routes are stored one per device/visit, so each source route gets its own copy, keyed on its _id
+    requests = [UpdateOne({'rolled_from': route['_id']}, {'$setOnInsert': rolled_route(route, year, month)}, upsert=True)
+                for route in batch]
+    result = routes.bulk_write(requests, ordered=False, session=session)
+    deleted = 0
+    if not keep_source:
+        # Only remove sources whose copy is confirmed to be in place
+        source_ids = [route['_id'] for route in batch]
+        copied = routes.distinct('rolled_from', {'rolled_from': {'$in': source_ids}}, session=session)
+        if copied:
+            deleted = routes.delete_many({'_id': {'$in': copied}}, session=session).deleted_count
+    checkpoints.update_one(
+        {'_id': checkpoint_id},
+        {'$set': {'last_id': batch[-1]['_id'], 'updated_at': datetime.now()},
+         '$inc': {'scanned': len(batch), 'upserted': result.upserted_count,
+                  'existing': result.matched_count, 'deleted': deleted, 'batches': 1}},
+        session=session,
+    )
+
+
+def rollover_routes(routes, checkpoints, year=None, month=None, batch_size=ROLLOVER_BATCH_SIZE,
+                    keep_source=False, use_transactions=True):
+    """Copy last month's routes into `year`/`month` (default: the current month).
+
+    Routes are read in _id order, batch_size at a time, and written with one
+    bulk upsert per batch keyed on the source route (`rolled_from`), so every
+    route gets exactly one copy and a rerun adds nothing. A source route is
+    only removed once its copy is confirmed to exist. Each batch's upserts, the removal of its source routes and the checkpoint
+    move together in a transaction when the deployment supports one; without
+    transactions every step is still idempotent. A run that dies part-way
+    resumes after the last checkpointed route, and a finished month is not
+    processed again. Returns a summary dict of counts and duration.
+    """
+    started = datetime.now()
+    if year is None or month is None:
+        year, month = started.year, started.month
+    source_year, source_month = _previous_month(year, month)
+    checkpoint_id = f"route_rollover:{year:04d}-{month:02d}"
+
+    checkpoint = checkpoints.find_one_and_update(
+        {'_id': checkpoint_id},
+        {'$setOnInsert': {'status': 'running', 'started_at': started, 'scanned': 0, 'upserted': 0,
+                          'existing': 0, 'deleted': 0, 'batches': 0}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    resumed = checkpoint.get('batches', 0) > 0
+    if checkpoint.get('status') != 'done':
+        client = routes.database.client
+        query = source_route_query(source_year, source_month)
+        while True:
+            page_query = dict(query)
+            if checkpoint.get('last_id') is not None:
+                page_query['_id'] = {'$gt': checkpoint['last_id']}
+            batch = list(routes.find(page_query).sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+            args = (routes, checkpoints, checkpoint_id, batch, year, month, keep_source)
+            if use_transactions:
+                try:
+                    with client.start_session() as session:
+                        session.with_transaction(lambda s: _apply_batch(*args, session=s))
+                except OperationFailure as e:
+                    # Standalone servers have no transactions (IllegalOperation); the batch did not apply
+                    if e.code != 20:
+                        raise
+                    print("Transactions unavailable; rolling routes over with checkpoints only")
+                    use_transactions = False
+                    _apply_batch(*args)
+            else:
+                _apply_batch(*args)
+            checkpoint['last_id'] = batch[-1]['_id']
+            if len(batch) < batch_size:
+                break
+        checkpoint = checkpoints.find_one_and_update(
+            {'_id': checkpoint_id},
+            {'$set': {'status': 'done', 'finished_at': datetime.now()}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    return {
+        'month': f"{year:04d}-{month:02d}",
+        'source_month': f"{source_year:04d}-{source_month:02d}",
+        'scanned': checkpoint.get('scanned', 0),
+        'upserted': checkpoint.get('upserted', 0),
+        'existing': checkpoint.get('existing', 0),
+        'deleted': checkpoint.get('deleted', 0),
+        'batches': checkpoint.get('batches', 0),
+        'resumed': resumed,
+        'duration': round((datetime.now() - started).total_seconds(), 2),
+    }
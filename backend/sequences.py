@@ -0,0 +1,68 @@
+import threading
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class Sequence:
+    """Human-readable running number backed by a document in a counters collection.
+
+    Each allocation is a single find_one_and_update with $inc, so numbers are
+    unique across gunicorn workers and never reused when records are deleted.
+    With block_size > 1 a worker reserves that many numbers per round trip and
+    hands them out locally; numbers left in a block when the worker exits are
+    skipped, and numbers from different workers interleave.
+
+    `seed` is called once, only if the counter does not exist yet, and returns
+    the last number already in use (e.g. the highest existing case_no).
+    """
+
+    def __init__(self, counters, name, block_size=1, seed=None):
+        self.counters = counters
+        self.name = name
+        self.block_size = max(1, int(block_size))
+        self.seed = seed
+        self._next = 0
+        self._last = -1
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    def _ensure_counter(self):
+        if self._seeded:
+            return
+        if self.seed is not None and self.counters.find_one({'_id': self.name}, {'_id': 1}) is None:
+            try:
+                self.counters.update_one({'_id': self.name}, {'$setOnInsert': {'value': int(self.seed() or 0)}},
+                                         upsert=True)
+            except DuplicateKeyError:
+                pass  # another worker created it first
+        self._seeded = True
+
+    def _reserve(self, count):
+        self._ensure_counter()
+        counter = self.counters.find_one_and_update(
+            {'_id': self.name},
+            {'$inc': {'value': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter['value'] - count + 1, counter['value']
+
+    def next(self):
+        with self._lock:
+            if self._next > self._last:
+                self._next, self._last = self._reserve(self.block_size)
+            value = self._next
+            self._next += 1
+            return value
+
+_sequences = {}
+_sequences_lock = threading.Lock()
+
+
+def get_sequence(counters, name, block_size=1, seed=None):
+    """Shared Sequence per (collection, name) within this process."""
+    key = (counters.full_name, name)
+    with _sequences_lock:
+        if key not in _sequences:
+            _sequences[key] = Sequence(counters, name, block_size, seed)
+        return _sequences[key]
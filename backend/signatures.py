@@ -0,0 +1,94 @@
+import base64
+import binascii
+import hashlib
+import io
+from pymongo import UpdateOne
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; signatures are then stored as the canvas produced them
+    Image = None
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+SIGNATURE_MIGRATION_BATCH = 200
+
+
+def decode_signature(data_url):
+    """PNG bytes from a signature pad data URL ('data:image/png;base64,...'), or None."""
+    if not data_url or not isinstance(data_url, str) or not data_url.startswith('data:image/png'):
+        return None
+    try:
+        data = base64.b64decode(data_url.split(',', 1)[1], validate=True)
+    except (IndexError, ValueError, binascii.Error):
+        return None
+    return data if data.startswith(PNG_MAGIC) else None
+
+
+def compact_png(data):
+    # Canvas PNGs are full RGBA; a greyscale+alpha, optimised re-encode is several times smaller
+    if Image is None:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            out = io.BytesIO()
+            img.convert('LA').save(out, 'PNG', optimize=True)
+        compacted = out.getvalue()
+    except Exception:
+        return data
+    return compacted if len(compacted) < len(data) else data
+
+
+def store_signature(fs, files, data_url):
+    """Store a signature pad data URL as a PNG in GridFS and return its file id (None if empty/invalid).
+
+    Blobs are deduplicated by the SHA-256 of the decoded image, so re-saving
+    an unchanged signature reuses the existing file.
+    """
+    data = decode_signature(data_url)
+    if data is None:
+        return None
+    sha256 = hashlib.sha256(data).hexdigest()
+    existing = files.find_one({'metadata.sha256': sha256, 'metadata.kind': 'signature'}, {'_id': 1})
+    if existing:
+        return existing['_id']
+    return fs.put(
+        compact_png(data),
+        filename=f"signature_{sha256[:16]}.png",
+        content_type='image/png',
+        # variants={} keeps the image variant backfill from resizing signatures
+        metadata={'kind': 'signature', 'sha256': sha256, 'content_type': 'image/png', 'variants': {}},
+    )
+
+
+def migrate_signatures(fs, files, collections, batch_size=SIGNATURE_MIGRATION_BATCH):
+    """Move inline data-URL signatures out of documents into GridFS (signature -> signature_id).
+
+    Safe to rerun: only documents still holding a string signature and no
+    signature_id are touched (a newer GridFS signature is never replaced),
+    and each update only applies if the signature is unchanged.
+    Returns counts per collection.
+    """
+    summary = {}
+    for collection in collections:
+        counts = {'migrated': 0, 'cleared': 0, 'skipped': 0}
+        requests = []
+        for doc in collection.find({'signature': {'$type': 'string'}, 'signature_id': None}, {'signature': 1}):
+            update = {'$unset': {'signature': ''}}
+            if doc['signature']:
+                signature_id = store_signature(fs, files, doc['signature'])
+                if signature_id is None:
+                    # Not a PNG data URL; leave it in place rather than lose it
+                    counts['skipped'] += 1
+                    continue
+                update['$set'] = {'signature_id': signature_id}
+                counts['migrated'] += 1
+            else:
+                counts['cleared'] += 1
+            requests.append(UpdateOne({'_id': doc['_id'], 'signature': doc['signature'], 'signature_id': None}, update))
+            if len(requests) >= batch_size:
+                collection.bulk_write(requests, ordered=False)
+                requests = []
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+        summary[collection.full_name] = counts
+    return summary
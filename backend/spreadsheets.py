@@ -0,0 +1,75 @@
+import csv
+import io
+import os
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # openpyxl is only needed for .xlsx; CSV files work without it
+    load_workbook = None
+
+SPREADSHEET_EXTENSIONS = {'.xlsx', '.csv'}
+
+
+class SpreadsheetError(ValueError):
+    """Spreadsheet could not be read (unsupported type, missing header); the message is shown to the user."""
+
+
+def normalize_header(value):
+    return ' '.join(str(value).split()).lower() if value is not None else ''
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _csv_rows(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+    else:
+        text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.reader(text)
+        finally:
+            text.detach()  # leave the underlying upload stream open for its owner
+
+
+def _xlsx_rows(source, sheet=None):
+    if load_workbook is None:
+        raise SpreadsheetError("Reading .xlsx files needs openpyxl; upload a CSV instead.")
+    # read_only streams rows from the zip instead of building the whole sheet in memory
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(values_only=True)
+    except KeyError:
+        raise SpreadsheetError(f"Sheet '{sheet}' not found.")
+    finally:
+        workbook.close()
+
+
+def iter_rows(source, filename=None, sheet=None):
+    """Yield (row number, {normalized header: value}) for each non-blank data row of a .xlsx or .csv file.
+
+    `source` is a path or a binary file object (e.g. an upload's stream);
+    `filename` picks the format when the source is not a path. Headers are
+    lower-cased with whitespace collapsed, and rows are read one at a time so
+    large sheets never sit in memory whole.
+    """
+    name = filename or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else '')
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in SPREADSHEET_EXTENSIONS:
+        raise SpreadsheetError("Unsupported file type. Please upload an .xlsx or .csv file.")
+    rows = _csv_rows(source) if extension == '.csv' else _xlsx_rows(source, sheet)
+
+    headers = None
+    for number, row in enumerate(rows, start=1):
+        if all(_blank(value) for value in row):
+            continue
+        if headers is None:
+            headers = [normalize_header(value) for value in row]
+            continue
+        yield number, {header: (value.strip() if isinstance(value, str) else value)
+                       for header, value in zip(headers, row) if header}
+    if headers is None:
+        raise SpreadsheetError("The spreadsheet has no header row.")
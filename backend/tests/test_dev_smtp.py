@@ -0,0 +1,24 @@
+import smtplib
+from email.message import EmailMessage
+
+from dev_smtp import DevSMTPServer
+
+
+def test_dev_smtp_server_keeps_messages():
+    message = EmailMessage()
+    message['From'] = 'noreply@example.com'
+    message['To'] = 'someone@example.com'
+    message['Subject'] = 'Case #42'
+    message.set_content('.leading dot\nsecond line')
+
+    with DevSMTPServer() as server:
+        with smtplib.SMTP('localhost', server.port) as client:
+            client.login('user', 'secret')
+            client.send_message(message)
+
+    assert len(server.messages) == 1
+    stored = server.messages[0]
+    assert stored['mail_from'] == 'noreply@example.com'
+    assert stored['rcpt_to'] == ['someone@example.com']
+    assert stored['message']['Subject'] == 'Case #42'
+    assert stored['message'].get_payload().startswith('.leading dot')
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pymongo')
+from filters import (CASE_INSENSITIVE, PREFIX_END, ROUTE_FILTERS, compile_filters,
+                     month_year_ranges, parse_int_list)
+
+SPEC = [
+    (('month', 'year'), 'created_at', 'month_year'),
+    ('company', 'company', 'prefix'),
+    ('colour', 'Color', 'exact'),
+    ('sn', 'S/N', 'number'),
+    ('status', 'status', 'enum'),
+]
+
+
+def test_blank_and_unparsable_values_are_ignored():
+    assert compile_filters(SPEC, {'company': '  ', 'sn': 'abc', 'month': '3', 'year': 'x'}) == {}
+
+
+def test_prefix_without_collation_is_escaped_regex():
+    assert compile_filters(SPEC, {'company': 'A.B (M)'}) == {
+        'company': {'$regex': r'^A\.B\ \(M\)', '$options': 'i'}}
+
+
+def test_prefix_with_collation_is_range():
+    assert compile_filters(SPEC, {'company': 'Acme'}, collation=CASE_INSENSITIVE) == {
+        'company': {'$gte': 'Acme', '$lt': 'Acme' + PREFIX_END}}
+
+
+def test_exact_number_and_enum():
+    query = compile_filters(SPEC, {'colour': 'Black', 'sn': '10-20', 'status': 'open, closed,'})
+    assert query == {
+        'Color': 'Black',
+        'S/N': {'$gte': 10, '$lte': 20},
+        'status': {'$in': ['open', 'closed']},
+    }
+    assert compile_filters(SPEC, {'sn': '42'}) == {'S/N': 42}
+
+
+def test_month_year_merges_consecutive_months():
+    query = compile_filters(SPEC, {'month': '1,2,5', 'year': '2024'})
+    assert query == {'$or': [
+        {'created_at': {'$gte': datetime(2024, 1, 1), '$lt': datetime(2024, 3, 1)}},
+        {'created_at': {'$gte': datetime(2024, 5, 1), '$lt': datetime(2024, 6, 1)}},
+    ]}
+
+
+def test_single_month_range_spans_year_end():
+    assert month_year_ranges('date', [12], 2024) == [
+        {'date': {'$gte': datetime(2024, 12, 1), '$lt': datetime(2025, 1, 1)}}]
+    assert compile_filters(ROUTE_FILTERS, {'month': '12', 'year': '2024'}) == month_year_ranges('date', [12], 2024)[0]
+
+
+def test_parse_int_list():
+    assert parse_int_list('1, 2,x,3') == [1, 2, 3]
+
+
+def test_unknown_match_type_raises():
+    with pytest.raises(ValueError):
+        compile_filters([('q', 'q', 'fuzzy')], {'q': 'x'})
@@ -0,0 +1,103 @@
+from datetime import datetime, time
+
+import pytest
+
+pytest.importorskip('pymongo')
+from importer import RowError, import_master_list, master_row, parse_month
+
+MONTH = datetime(2024, 5, 1)
+
+
+def test_master_row_maps_headers_and_numbers():
+    doc = master_row({
+        'company name': ' Acme ',
+        'premise': 'HQ',
+        'serial number': 1001.0,
+        'volume': '500',
+        'balance': '12.5',
+        'e1 - start': time(8, 0),
+        'unknown column': 'ignored',
+    }, MONTH)
+    assert doc == {
+        'company': 'Acme',
+        'Premise Name': 'HQ',
+        'S/N': 1001,
+        'Volume': 500,
+        'Balance': 12.5,
+        'E1 - START': '08:00:00',
+        'month_year': MONTH,
+    }
+
+
+def test_month_columns_override_the_default():
+    assert master_row({'company': 'Acme', 's/n': 1, 'month_year': '2024-02-15'}, MONTH)['month_year'] == \
+        datetime(2024, 2, 1)
+    assert master_row({'company': 'Acme', 's/n': 1, 'month': '3', 'year': 2024})['month_year'] == \
+        datetime(2024, 3, 1)
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'s/n': 1}, "company is required"),
+    ({'company': 'Acme', 's/n': 'A1'}, "S/N 'A1' is not a number"),
+    ({'company': 'Acme', 's/n': 1.5}, "S/N '1.5' is not a whole number"),
+    ({'company': 'Acme', 's/n': 1}, "no month: add a month_year (or month and year) column or pick a month"),
+    ({'company': 'Acme', 's/n': 1, 'month_year': 'May'}, "month 'May' is not a YYYY-MM date"),
+])
+def test_master_row_errors(row, message):
+    with pytest.raises(RowError) as error:
+        master_row(row)
+    assert str(error.value) == message
+
+
+def test_parse_month():
+    assert parse_month('') is None
+    assert parse_month('2024-07') == datetime(2024, 7, 1)
+    assert parse_month(datetime(2024, 7, 19, 10)) == datetime(2024, 7, 1)
+
+
+class NoWrites:
+    def bulk_write(self, requests, ordered=True):
+        raise AssertionError("a dry run must not write")
+
+
+def test_dry_run_reports_without_writing():
+    rows = [
+        (2, {'company': 'Acme', 's/n': 1}),
+        (3, {'company': 'Beta', 's/n': 2}),
+        (4, {'company': 'Acme', 's/n': 1}),
+        (5, {'company': '', 's/n': 3}),
+    ]
+    report = import_master_list(rows, NoWrites(), month=MONTH, dry_run=True)
+    assert (report['rows'], report['valid'], report['failed']) == (4, 2, 2)
+    assert report['errors'] == [
+        {'row': 4, 'error': "duplicates row 2 (same company, S/N and month)"},
+        {'row': 5, 'error': "company is required"},
+    ]
+    assert report['companies'] == ['Acme', 'Beta']
+    assert report['dry_run'] is True
+    assert (report['inserted'], report['updated'], report['unchanged']) == (0, 0, 0)
+
+
+class FakeResult:
+    def __init__(self, count):
+        self.upserted_count = count
+        self.modified_count = 0
+        self.matched_count = 0
+
+
+class RecordingTarget:
+    def __init__(self):
+        self.batches = []
+
+    def bulk_write(self, requests, ordered=True):
+        self.batches.append(list(requests))
+        return FakeResult(len(requests))
+
+
+def test_import_writes_in_batches():
+    target = RecordingTarget()
+    rows = [(n, {'company': 'Acme', 's/n': n}) for n in range(2, 7)]
+    report = import_master_list(rows, target, month=MONTH, batch_size=2)
+    assert [len(batch) for batch in target.batches] == [2, 2, 1]
+    assert report['inserted'] == 5
+    assert target.batches[0][0]._filter == {'company': 'Acme', 'S/N': 2, 'month_year': MONTH}
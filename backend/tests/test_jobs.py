@@ -0,0 +1,60 @@
+import importlib
+import sys
+import types
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('apscheduler')
+pytest.importorskip('pymongo')
+
+
+class FakeRuns:
+    def __init__(self):
+        self.runs = []
+
+    def find_one(self, query, projection=None):
+        return next((run for run in self.runs if all(run.get(k) == v for k, v in query.items())), None)
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    # jobs imports its collections from col, which connects to Mongo; hand it in-memory ones
+    col = types.ModuleType('col')
+    col.job_runs_collection = FakeRuns()
+    col.job_locks_collection = None
+    monkeypatch.setitem(sys.modules, 'col', col)
+    sys.modules.pop('jobs', None)
+    module = importlib.import_module('jobs')
+    yield module
+    sys.modules.pop('jobs', None)
+
+
+def at(hour, minute=0):
+    return datetime(2024, 3, 2, hour, minute, tzinfo=timezone.utc)
+
+
+def test_due_within_misfire_grace(jobs):
+    jobs.job('nightly', misfire_grace=3600, hour=0, minute=0, timezone='UTC')(lambda: None)
+    assert jobs.due_occurrence('nightly', now=at(0, 30)) == at(0)
+
+
+def test_not_due_once_the_grace_has_passed(jobs):
+    jobs.job('nightly', misfire_grace=3600, hour=0, minute=0, timezone='UTC')(lambda: None)
+    assert jobs.due_occurrence('nightly', now=at(2)) is None
+
+
+def test_not_due_when_the_occurrence_already_ran(jobs):
+    jobs.job('nightly', misfire_grace=3600, hour=0, minute=0, timezone='UTC')(lambda: None)
+    jobs.job_runs_collection.runs.append({'job': 'nightly', 'scheduled_for': at(0)})
+    assert jobs.due_occurrence('nightly', now=at(0, 30)) is None
+
+
+def test_missed_occurrences_coalesce_into_the_latest(jobs):
+    jobs.job('hourly', misfire_grace=4 * 3600, minute=0, timezone='UTC')(lambda: None)
+    assert jobs.due_occurrence('hourly', now=at(3, 30)) == at(3)
+
+
+def test_manual_jobs_are_never_due(jobs):
+    jobs.job('manual')(lambda: None)
+    assert jobs.due_occurrence('manual', now=at(3)) is None
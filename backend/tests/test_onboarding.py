@@ -0,0 +1,108 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pymongo')
+pytest.importorskip('flask_mail')
+from onboarding import add_spreadsheet_devices, build_master_rows, parse_onboarding_form, validate_onboarding
+
+NOW = datetime(2024, 6, 1, 9, 0)
+
+
+class FakeDevices:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+
+    def find(self, query, projection=None):
+        wanted = query['S/N']['$in']
+        return [doc for doc in self.docs if doc['S/N'] in wanted]
+
+
+def form(**overrides):
+    values = {
+        'companyName': ' Acme ',
+        'industry': 'Retail',
+        'dateCreated': '2024-06-01',
+        'premiseName1': 'HQ',
+        'premiseArea1': 'North',
+        'premiseName2': 'Branch',
+        'picName1': 'Ali',
+        'picEmail1': 'ali@example.com',
+        'contactPremise1': 'all',
+        'picName2': 'Siti',
+        'contactPremise2': 'Branch',
+        'deviceSN1': '1001',
+        'devicePremise1': 'HQ',
+        'deviceVolume1': '500',
+        'deviceSN2': '1002',
+        'devicePremise2': 'Branch',
+    }
+    values.update(overrides)
+    return values
+
+
+def test_parse_onboarding_form():
+    payload = parse_onboarding_form(form(), now=NOW)
+    assert payload['company'] == 'Acme'
+    assert payload['date_created'] == datetime(2024, 6, 1)
+    assert [premise['premise_name'] for premise in payload['premises']] == ['HQ', 'Branch']
+    assert [pic['name'] for pic in payload['pics']] == ['Ali', 'Siti']
+    label, device = payload['devices'][0]
+    assert label == 'Device 1'
+    assert device['company'] == 'Acme'
+    assert device['S/N'] == 1001 and device['Volume'] == 500
+    assert device['created_at'] == NOW
+    assert payload['errors'] == []
+
+
+def test_valid_payload_has_no_errors():
+    payload = parse_onboarding_form(form(), now=NOW)
+    assert validate_onboarding(payload, FakeDevices()) == []
+
+
+def test_validation_reports_every_problem():
+    payload = parse_onboarding_form(form(deviceSN2='1001', devicePremise2='Nowhere', contactPremise2='Annex',
+                                         premiseName2='HQ'), now=NOW)
+    errors = validate_onboarding(payload, FakeDevices())
+    assert "Premise 'HQ' is listed more than once." in errors
+    assert "PIC Siti: premise 'Annex' is not one of this company's premises." in errors
+    assert "Device 2: S/N 1001 is already used by Device 1." in errors
+    assert "Device 2: premise 'Nowhere' is not one of this company's premises." in errors
+
+
+def test_validation_rejects_registered_and_non_numeric_serials():
+    payload = parse_onboarding_form(form(deviceSN2='12A'), now=NOW)
+    errors = validate_onboarding(payload, FakeDevices([{'S/N': 1001, 'company': 'Other Co'}]))
+    assert errors == [
+        "Device 2: S/N '12A' is not a whole number.",
+        "Device 1: S/N 1001 is already registered to Other Co.",
+    ]
+
+
+def test_missing_company_premises_and_devices():
+    errors = validate_onboarding(parse_onboarding_form({}, now=NOW), FakeDevices())
+    assert errors == ["Company name is required.", "Add at least one premise.", "Add at least one device."]
+
+
+def test_spreadsheet_devices_use_row_labels():
+    payload = parse_onboarding_form(form(deviceSN1='', deviceSN2=''), now=NOW)
+    count = add_spreadsheet_devices(payload, [(2, {'serial number': 2001.0, 'premise': 'HQ', 'colour': 'White'})], now=NOW)
+    assert count == 1
+    label, device = payload['devices'][0]
+    assert label == 'Row 2'
+    assert (device['S/N'], device['tied_to_premise'], device['Color']) == (2001, 'HQ', 'White')
+
+
+def test_empty_spreadsheet_is_an_error():
+    payload = parse_onboarding_form(form(), now=NOW)
+    assert add_spreadsheet_devices(payload, [], now=NOW) == 0
+    assert payload['errors'] == ["The device spreadsheet has no rows."]
+
+
+def test_master_rows_flatten_the_primary_pic():
+    rows = build_master_rows(parse_onboarding_form(form(), now=NOW))
+    hq, branch = rows
+    assert hq['premise_area'] == 'North' and hq['name'] == 'Ali'
+    assert [pic['name'] for pic in hq['pics']] == ['Ali']
+    assert [pic['name'] for pic in branch['pics']] == ['Ali', 'Siti']
+    assert (hq['S/N'], branch['S/N']) == (1001, 1002)
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('bson')
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pagination import LAST_PAGE, _beyond, decode_cursor, encode_cursor, paginate, without_cursors
+
+
+def test_cursor_round_trip():
+    doc = {'_id': ObjectId(), 'timestamp': datetime(2024, 5, 1, 12, 30)}
+    token = encode_cursor(doc, 'timestamp')
+    assert '=' not in token
+    assert decode_cursor(token) == (doc['timestamp'], doc['_id'])
+
+
+def test_cursor_missing_sort_value():
+    doc = {'_id': ObjectId()}
+    assert decode_cursor(encode_cursor(doc, 'name')) == (None, doc['_id'])
+
+
+@pytest.mark.parametrize('token', [None, '', 'not-a-cursor', '!!!'])
+def test_decode_cursor_rejects_bad_tokens(token):
+    assert decode_cursor(token) is None
+
+
+def test_beyond_on_id():
+    last_id = ObjectId()
+    assert _beyond('_id', last_id, last_id, ASCENDING) == {'_id': {'$gt': last_id}}
+    assert _beyond('_id', last_id, last_id, DESCENDING) == {'_id': {'$lt': last_id}}
+
+
+def test_beyond_descending_date_reaches_older_string_values():
+    # Legacy log rows have string timestamps, which sort before every date
+    when, last_id = datetime(2024, 1, 1), ObjectId()
+    conditions = _beyond('timestamp', when, last_id, DESCENDING)['$or']
+    assert {'timestamp': {'$lt': when}} in conditions
+    assert {'timestamp': when, '_id': {'$lt': last_id}} in conditions
+    assert {'timestamp': {'$type': ['number', 'string', 'object', 'binData', 'objectId', 'bool']}} in conditions
+    assert {'timestamp': None} in conditions
+
+
+def test_beyond_ascending_string_reaches_later_types():
+    conditions = _beyond('timestamp', '2023-01-01', ObjectId(), ASCENDING)['$or']
+    assert {'timestamp': {'$type': ['object', 'binData', 'objectId', 'bool', 'date', 'timestamp']}} in conditions
+    assert {'timestamp': None} not in conditions
+
+
+def test_beyond_null_value():
+    last_id = ObjectId()
+    assert _beyond('name', None, last_id, ASCENDING) == {
+        '$or': [{'name': {'$ne': None}}, {'name': None, '_id': {'$gt': last_id}}]}
+    assert _beyond('name', None, last_id, DESCENDING) == {'name': None, '_id': {'$lt': last_id}}
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def sort(self, sort):
+        self.calls.append(('sort', sort))
+        for key, direction in reversed(sort):
+            self.docs.sort(key=lambda doc: doc[key], reverse=direction == DESCENDING)
+        return self
+
+    def skip(self, count):
+        self.calls.append(('skip', count))
+        self.docs = self.docs[count:]
+        return self
+
+    def limit(self, count):
+        self.calls.append(('limit', count))
+        self.docs = self.docs[:count]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.cursor = None
+
+    def find(self, query, projection=None, collation=None):
+        self.cursor = FakeCursor(list(self.docs))
+        return self.cursor
+
+
+def test_last_page_reads_backwards_without_skip():
+    docs = [{'_id': n} for n in range(1, 8)]
+    collection = FakeCollection(docs)
+    page, cursors = paginate(collection, {}, page=3, limit=3, before=LAST_PAGE)
+    assert [doc['_id'] for doc in page] == [5, 6, 7]
+    assert ('sort', [('_id', DESCENDING)]) in collection.cursor.calls
+    assert not any(name == 'skip' for name, _ in collection.cursor.calls)
+    assert decode_cursor(cursors['prev']) == (5, 5)
+
+
+def test_without_cursors_keeps_other_params():
+    params = {'page': '2', 'after': 'x', 'model_before': 'y', 'q': 'z'}
+    assert without_cursors(params, 'model_') == {'page': '2', 'after': 'x', 'q': 'z'}
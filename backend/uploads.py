@@ -0,0 +1,70 @@
+import hashlib
+import os
+from werkzeug.utils import secure_filename
+
+UPLOAD_CHUNK_SIZE = 255 * 1024  # GridFS default chunk size, so each read fills one chunk
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE') or 10 * 1024 * 1024)
+IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/heic'}
+
+
+class UploadError(ValueError):
+    """Upload rejected (too large, empty or an unsupported type); the message is shown to the user."""
+
+
+def sniff_content_type(head):
+    """Content type from a file's leading bytes, or None if it is not a recognised format."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:12] in (b'ftypheic', b'ftypheix', b'ftypmif1', b'ftypmsf1'):
+        return 'image/heic'
+    if head.startswith(b'%PDF-'):
+        return 'application/pdf'
+    return None
+
+
+def store_upload(fs, file_storage, max_size=MAX_UPLOAD_SIZE, allowed_types=IMAGE_TYPES):
+    """Copy an uploaded file into GridFS one chunk at a time and return its id (None if no file).
+
+    The content type is sniffed from the first chunk rather than trusted from
+    the browser, the size limit is enforced while copying and the SHA-256 is
+    computed on the fly and kept in metadata (media.py uses it as the ETag).
+    A rejected upload raises UploadError and leaves nothing behind in GridFS.
+    """
+    if not file_storage or not file_storage.filename:
+        return None
+    stream = file_storage.stream
+    chunk = stream.read(UPLOAD_CHUNK_SIZE)
+    if not chunk:
+        raise UploadError("The uploaded file is empty.")
+    content_type = sniff_content_type(chunk)
+    if allowed_types and content_type not in allowed_types:
+        raise UploadError("Unsupported file type. Please upload a JPEG, PNG, GIF, WebP or HEIC image.")
+
+    digest = hashlib.sha256()
+    size = 0
+    grid_in = fs.new_file(filename=secure_filename(file_storage.filename) or 'upload',
+                          content_type=content_type, chunk_size=UPLOAD_CHUNK_SIZE)
+    try:
+        while chunk:
+            size += len(chunk)
+            if size > max_size:
+                raise UploadError(f"File is too large (max {max_size // (1024 * 1024)} MB).")
+            digest.update(chunk)
+            grid_in.write(chunk)
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        grid_in.metadata = {
+            'content_type': content_type,
+            'sha256': digest.hexdigest(),
+            'client_content_type': file_storage.content_type,
+        }
+        grid_in.close()
+    except BaseException:
+        grid_in.abort()
+        raise
+    return grid_in._id
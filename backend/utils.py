@@ -1,15 +1,18 @@
 from datetime import datetime, timedelta
 from flask_mail import Mail, Message
-import calendar
 from flask import flash
+from activity_log import get_log_writer
+from mail_queue import enqueue_email
+from mail_templates import mail_templates
 
 def log_activity(name, action, database):
+    """Queue an activity log entry; it is written in batches by a background thread."""
     log_entry = {
         "user": name,
         "action": action,
         "timestamp": datetime.now(),
     }
-    database.insert_one(log_entry)
+    get_log_writer(database).write(log_entry)
 
 def safe_int(value):
     try:
@@ -17,18 +20,38 @@ def safe_int(value):
     except (ValueError, TypeError):
         return value
     
-def send_email_to_customer(case_no, user_email, from_email, mail):
-    """Send a confirmation email to the customer."""
-    subject = f"Case #{case_no} Created Successfully"
-    body = f"Thank you for submitting your case. Your case number is #{case_no}. Our staff will get in touch with you shortly."
-    send_email(user_email, from_email, subject, body, mail)
-
-
-def send_email_to_admin(case_no, user_email, from_email, mail):
-    """Notify admin about a new case creation."""
-    subject = f"New Case #{case_no} Created"
-    body = f"A new case with case number #{case_no} has been created. Please check the system for details."
-    send_email(user_email, from_email, subject, body, mail)
+def render_mail(template_name, fallback_subject, fallback_body, **context):
+    """Render a mail.json template, falling back to the given text if it is missing, inactive or fails."""
+    try:
+        rendered = mail_templates.render(template_name, **context)
+    except Exception as e:
+        print(f"Failed to render mail template {template_name}: {e}")
+        rendered = None
+    return rendered or (fallback_subject, fallback_body)
+
+
+def send_email_to_customer(case_no, user_email, from_email, outbox, **details):
+    """Queue a confirmation email to the customer."""
+    subject, body = render_mail(
+        "help_request_new_case_created",
+        f"Case #{case_no} Created Successfully",
+        f"Thank you for submitting your case. Your case number is #{case_no}. Our staff will get in touch with you shortly.",
+        case_id=f"#{case_no}", **details)
+    enqueue_email(outbox, user_email, from_email, subject, body, kind="case_created_customer")
+
+
+def send_email_to_admin(case_no, team_email, from_email, outbox, image_id=None, **details):
+    """Queue a notification to the team about a new case creation, with the device photo attached."""
+    if not team_email:
+        print(f"No team email configured; case #{case_no} notification not sent")
+        return
+    subject, body = render_mail(
+        "team_help_request_new_case_received",
+        f"New Case #{case_no} Created",
+        f"A new case with case number #{case_no} has been created. Please check the system for details.",
+        case_id=f"#{case_no}", **details)
+    enqueue_email(outbox, team_email, from_email, subject, body, kind="case_created_admin",
+                  attachments=[image_id] if image_id else None)
 
 
 # def send_email(to_email, subject, body):
@@ -62,41 +85,5 @@ def send_email(to_email, from_email, subject, body, mail):
         print(f"Failed to send email: {e}")
 
 
-def replicate_monthly_routes(database):
-    current_date = datetime.now()
-    previous_month = (current_date.month - 1) if current_date.month > 1 else 12
-    previous_year = current_date.year if current_date.month > 1 else current_date.year - 1
-
-    routes_to_copy = list(database.find({"month": previous_month, "year": previous_year}))
-
-    new_routes = []
-    for route in routes_to_copy:
-        new_month = current_date.month
-        new_year = current_date.year
-
-        # Adjust day to fit within the month's days (e.g., 31st March → 30th April)
-        max_days = calendar.monthrange(new_year, new_month)[1]
-        new_day = min(route.get("day", 1), max_days)
-
-        # Create new entry
-        new_route = {
-            "company": route["company"],
-            "premise_name": route["premise_name"],
-            "premise_area": route["premise_area"],
-            "premise_address": route["premise_address"],
-            "pics": route["pics"],
-            "model": route["model"],
-            "color": route["color"],
-            "eo": route["eo"],
-            "day": new_day,
-            "month": new_month,
-            "year": new_year
-        }
-        new_routes.append(new_route)
-
-    if new_routes:
-        database.insert_many(new_routes)
-        database.delete_many({"month": previous_month, "year": previous_year})
-
 def flash_message(message, category="info"):
     flash(message, category)
\ No newline at end of file